@@ -0,0 +1,79 @@
+# bench_fingerprint.py
+# So sánh bộ nhớ: dedup key dạng chuỗi "ts|msg" (hiện tại) vs digest 64-bit
+#   python bench_fingerprint.py --keys 1000000
+import gc
+import json
+import random
+import argparse
+import datetime
+import tracemalloc
+
+from fingerprint import fingerprint, FingerprintSet
+
+
+def make_messages(n, table_ratio, seed=1):
+    rnd = random.Random(seed)
+    table_row = "│ {uid:>3} │ {win} │ 0.1234 │ 0.5678 │ 0.9 │ 1.0 │ 0.0 │ {w:.4f} │\n"
+    base = datetime.datetime(2026, 1, 1)
+
+    for i in range(n):
+        ts = (base + datetime.timedelta(milliseconds=i * 37)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        if rnd.random() < table_ratio:
+            # bảng weight ~ vài KB
+            msg = "Updated scores for evaluated UIDs\n" + "".join(
+                table_row.format(uid=u, win=60450 + i % 7, w=rnd.random()) for u in range(40)
+            )
+        else:
+            msg = (
+                f"Skipped score of UID {rnd.randrange(256)} in window {60450 + i % 7}: "
+                f"avg_steps_behind={rnd.random() * 10:.3f} > max, seq={i} "
+                + "x" * rnd.randrange(40, 160)
+            )
+        yield ts, msg
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--table-ratio", type=float, default=0.02)
+    args = parser.parse_args()
+
+    now = datetime.datetime.now()
+    stamp = now.timestamp()
+
+    def strings():
+        # seen = {ts|msg: datetime}; cả thân log nằm trong key
+        return {ts + "|" + msg: now for ts, msg in make_messages(args.keys, args.table_ratio)}
+
+    def digests():
+        s = FingerprintSet(capacity=args.keys)
+        for ts, msg in make_messages(args.keys, args.table_ratio):
+            s.add(fingerprint(ts, msg), stamp)
+        return s
+
+    old, old_mem = measure(strings)
+    old_file = len(json.dumps({k: True for k in old}))
+    del old
+
+    new, new_mem = measure(digests)
+    new_file = len(json.dumps({"version": 2, "digests": [f"{k:016x}" for k in new]}))
+
+    mb = 1024 * 1024
+    print(f"keys: {args.keys:,}  (weight tables: {args.table_ratio:.0%})")
+    print(f"{'':18}{'memory':>12}{'history file':>16}")
+    print(f"{'str keys (today)':18}{old_mem / mb:>10.1f}MB{old_file / mb:>14.1f}MB")
+    print(f"{'FingerprintSet':18}{new_mem / mb:>10.1f}MB{new_file / mb:>14.1f}MB")
+    print(f"memory ratio: {old_mem / new_mem:.1f}x, file ratio: {old_file / new_file:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench_parse.py
+# Scaling của RowParser theo số worker trên các dòng Grafana giả lập
+#   python bench_parse.py --rows 5000 --max-workers 8
+import os
+import time
+import random
+import argparse
+import datetime
+
+from row_parser import RowParser, parse_rows
+
+
+def make_rows(n, seed=1):
+    rnd = random.Random(seed)
+    now = datetime.datetime.now()
+    rows = []
+    for i in range(n):
+        ts = (now - datetime.timedelta(seconds=rnd.randrange(3000))).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        uid = rnd.randrange(256)
+        msg = (
+            f"Skipped score of UID {uid} in window {60450 + i % 7}: "
+            f"avg_steps_behind={rnd.random() * 10:.3f} > max, seq={i}"
+        )
+        rows.append(
+            '<td class="logs-row__level"></td>'
+            '<td class="logs-row__toggle-details"><svg></svg></td>'
+            f'<td class="logs-row__localtime">{ts}</td>'
+            '<td class="logs-row__labels">'
+            f'<span title="eval_uid: {uid}">{uid}</span>'
+            f'<span title="current_window: {60450 + i % 7}">{60450 + i % 7}</span>'
+            '</td>'
+            f'<td class="logs-row__message"><div>{msg}</div></td>'
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    expected = parse_rows(rows)
+
+    print(f"rows: {args.rows:,}, cpus: {os.cpu_count()}")
+    base = None
+    workers = 1
+    while workers <= args.max_workers:
+        rp = RowParser(workers=workers, threshold=0)
+        rp.parse(rows[:workers * 8])      # khởi động pool
+
+        best = None
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            out = rp.parse(rows)
+            dt = time.perf_counter() - t
+            best = dt if best is None else min(best, dt)
+        rp.close()
+
+        assert [r.fp for r in out] == [r.fp for r in expected]
+        base = base or best
+        print(f"workers={workers:<3} {best * 1000:8.1f} ms   {args.rows / best:9.0f} rows/s   x{base / best:.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# chrome_driver.py
+import os
+import re
+import json
+import time
+import shutil
+import subprocess
+
+# selenium / webdriver_manager chỉ được import khi thật sự mở Chrome
+# → import module này (và crawler) gần như tức thì
+
+DRIVER_CACHE_FILE = "chromedriver_cache.json"
+
+CHROME_CANDIDATES = [
+    "/usr/bin/google-chrome",
+    "/usr/bin/chromium-browser",
+    "/usr/bin/chromium",
+    "/snap/bin/chromium",
+    "google-chrome",
+    "chromium",
+]
+
+
+# =====================================================
+# CLEAN OLD CHROME
+# =====================================================
+def clean_chrome_processes():
+    patterns = [
+        "chrome --headless",
+        "chromedriver",
+        "google-chrome",
+        "chromium"
+    ]
+    for p in patterns:
+        try:
+            subprocess.call(["pkill", "-f", p])
+        except:
+            pass
+
+
+# =====================================================
+# BROWSER DETECTION
+# =====================================================
+def find_chrome_binary():
+    for p in CHROME_CANDIDATES:
+        path = p if os.path.isabs(p) else shutil.which(p)
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def browser_version(binary=None):
+    binary = binary or find_chrome_binary()
+    if not binary:
+        return None
+    try:
+        out = subprocess.run(
+            [binary, "--version"], capture_output=True, text=True, timeout=10
+        ).stdout
+    except:
+        return None
+    m = re.search(r"(\d+\.\d+\.\d+\.\d+)", out)
+    return m.group(1) if m else None
+
+
+# =====================================================
+# CHROMEDRIVER RESOLUTION (cached theo version Chrome)
+# =====================================================
+def load_driver_cache():
+    try:
+        with open(DRIVER_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def save_driver_cache(cache):
+    try:
+        with open(DRIVER_CACHE_FILE, "w") as f:
+            json.dump(cache, f, indent=1)
+    except:
+        pass
+
+
+def resolve_chromedriver(log=print, binary=None):
+    """
+    Đường dẫn chromedriver khớp với Chrome đang cài.
+
+    Cache hit (cùng version Chrome, file còn tồn tại) → không gọi mạng.
+    Cache miss → ChromeDriverManager().install() rồi ghi cache.
+    Offline / lỗi → driver cache gần nhất, chromedriver trong PATH,
+    hoặc None để Selenium Manager tự xử lý.
+    """
+    cache = load_driver_cache()
+    version = browser_version(binary)
+
+    cached = cache.get(version) if version else None
+    if cached and os.path.exists(cached):
+        return cached
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+        if version:
+            cache[version] = path
+        cache["last"] = path
+        save_driver_cache(cache)
+        return path
+    except Exception as e:
+        log(f">>> ChromeDriverManager failed ({e}) → offline fallback")
+
+    last = cache.get("last")
+    if last and os.path.exists(last):
+        return last
+    return shutil.which("chromedriver")
+
+
+# =====================================================
+# START DRIVER
+# =====================================================
+def start_driver(window_size="1920,4000", extra_args=(), binary=None,
+                 log=print, page_load_timeout=60):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    opts = webdriver.ChromeOptions()
+    opts.add_argument("--headless=new")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument(f"--window-size={window_size}")
+    for a in extra_args:
+        opts.add_argument(a)
+    if binary:
+        opts.binary_location = binary
+
+    path = resolve_chromedriver(log, binary)
+    service = Service(path) if path else Service()
+
+    driver = webdriver.Chrome(service=service, options=opts)
+    # driver.get treo → exception thay vì treo vô hạn
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+# =====================================================
+# STARTUP TIMING (launch → first processed row)
+# =====================================================
+class StartupTimer:
+    def __init__(self, log):
+        self.log = log
+        self.t0 = time.time()
+        self.marks = []
+        self.done = False
+
+    def mark(self, name):
+        self.marks.append((name, time.time() - self.t0))
+
+    def first_row(self):
+        if self.done:
+            return
+        self.done = True
+        self.mark("first row")
+        self.log(">>> Startup: " + ", ".join(f"{n} {t:.1f}s" for n, t in self.marks))
@@ -0,0 +1,256 @@
+# control.py
+# Control endpoint localhost cho crawler đang chạy (HTTP, chỉ bind 127.0.0.1):
+#   curl localhost:8765/state
+#   curl -X POST localhost:8765/pause          (hoặc /resume)
+#   curl -X POST localhost:8765/uids -d '{"uids": [10, 44, 51]}'
+#   curl -X POST localhost:8765/uids -d '{"add": [204], "remove": [44]}'
+#   curl -X POST localhost:8765/reload -d '{"mode": "hard"}'     (soft = refresh, hard = mở lại URL)
+# URL dashboard phụ thuộc UID set → đổi UID mà URL đổi thì tự hard reload.
+# URL thu hẹp mà trống trong khi URL gốc có dòng → quay về URL gốc, tắt narrow.
+# Server chạy trong process con cạnh Chrome; thay đổi chỉ được ghi nhận rồi
+# áp dụng ở đầu cycle kế tiếp trong thread crawler → không restart Chrome,
+# không mất state trong RAM. paused + uids lưu vào control_<name>.json để
+# process con do supervisor spawn lại vẫn giữ; file gắn PID supervisor (owner)
+# → start lại từ đầu (PM2 restart, deploy) quay về FIXED_UIDS, không bị pause.
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from profiler import read_gauges
+
+
+class Control:
+    def __init__(self, name, uids, cast=int, port=0, log=print, state_file=None):
+        self.name = name
+        self.uids = uids            # list dùng chung với các stage, sửa tại chỗ
+        self.cast = cast
+        self.log = log
+        self.state_file = state_file or f"control_{name}.json"
+
+        self.lock = threading.Lock()
+        self.paused = False
+        self._pending_uids = None
+        self._reload = None
+
+        self.started = time.time()
+        self.cycles = 0
+        self.last_cycle = None
+        self.reloads = 0
+        self.url = None
+        self.plain_url = None       # URL dashboard gốc (fallback khi thu hẹp hỏng)
+        self.narrow = True          # đẩy time range + regex UID xuống Grafana
+        self.stats = None           # callable → text (Pipeline.report)
+        self.server = None
+
+        self._load()
+        if port:
+            self.serve(port)
+
+    # -------------------------------------------------
+    # PERSIST
+    # -------------------------------------------------
+    def _load(self):
+        try:
+            with open(self.state_file, "r") as f:
+                data = json.load(f)
+        except:
+            return
+        # chỉ state do chính supervisor này ghi (process con bị spawn lại)
+        if data.get("owner") != os.getppid():
+            self.log(f">>> [control] ignoring {self.state_file} from a previous run")
+            return
+        self.paused = bool(data.get("paused", False))
+        if data.get("uids") is not None:
+            try:
+                self.uids[:] = [self.cast(u) for u in data["uids"]]
+            except:
+                pass
+        self.log(f">>> [control] restored paused={self.paused} uids={self.uids}")
+
+    def _save(self):
+        with self.lock:
+            uids = self._pending_uids if self._pending_uids is not None else list(self.uids)
+            data = {"paused": self.paused, "uids": uids, "owner": os.getppid()}
+        tmp = self.state_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            self.log(f">>> [control] cannot save state: {e}")
+
+    # -------------------------------------------------
+    # COMMANDS (gọi từ thread HTTP)
+    # -------------------------------------------------
+    def set_paused(self, paused):
+        self.paused = paused
+        self._save()
+        self.log(f">>> [control] {'paused' if paused else 'resumed'}")
+
+    def set_uids(self, uids=None, add=(), remove=()):
+        """Raise ValueError nếu UID không hợp lệ."""
+        if uids is not None and not isinstance(uids, list):
+            raise ValueError("uids must be a list")
+        with self.lock:
+            current = self._pending_uids if self._pending_uids is not None else list(self.uids)
+            new = [self.cast(u) for u in uids] if uids is not None else list(current)
+            for u in add:
+                u = self.cast(u)
+                if u not in new:
+                    new.append(u)
+            drop = {self.cast(u) for u in remove}
+            new = [u for u in new if u not in drop]
+            self._pending_uids = new
+        self._save()
+        return new
+
+    def request_reload(self, mode="soft"):
+        if mode not in ("soft", "hard"):
+            raise ValueError(f"unknown reload mode {mode!r}")
+        with self.lock:
+            # hard thắng soft nếu cùng chờ trong một cycle
+            if self._reload != "hard":
+                self._reload = mode
+
+    def state(self):
+        with self.lock:
+            pending_uids = self._pending_uids
+            pending_reload = self._reload
+        return {
+            "name": self.name,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "paused": self.paused,
+            "uids": list(self.uids),
+            "pending_uids": pending_uids,
+            "pending_reload": pending_reload,
+            "cycles": self.cycles,
+            "last_cycle_age": round(time.time() - self.last_cycle, 1) if self.last_cycle else None,
+            "reloads": self.reloads,
+            "url": self.url,
+            "narrow": self.narrow,
+            "gauges": read_gauges(),
+            "stages": self.stats().splitlines()[1:] if self.stats else [],
+        }
+
+    # -------------------------------------------------
+    # APPLY (gọi từ thread crawler ở đầu mỗi cycle)
+    # -------------------------------------------------
+    def before_cycle(self, driver, url=None, wait=None):
+        """url: chuỗi hoặc hàm () → URL hiện tại (dựng lại theo UID set)."""
+        self.cycles += 1
+        self.last_cycle = time.time()
+
+        with self.lock:
+            uids, self._pending_uids = self._pending_uids, None
+            mode, self._reload = self._reload, None
+
+        if uids is not None:
+            self.uids[:] = uids
+            self.log(f">>> [control] UIDs = {uids}")
+
+        target = url() if callable(url) else url
+        if target and target != self.url:
+            mode = "hard"
+
+        if mode:
+            self.reloads += 1
+            self.log(f">>> [control] {mode} reload")
+            try:
+                if mode == "hard" and target:
+                    self.open(driver, target, wait)
+                else:
+                    driver.refresh()
+                    if wait:
+                        wait()
+            except Exception as e:
+                self.log(f">>> [control] reload failed: {e}")
+
+    def open(self, driver, url, wait=None):
+        """
+        driver.get(url) rồi chờ dòng log (wait() → bool). URL thu hẹp không có
+        dòng nào mà plain_url có (biến Search của dashboard không nhận regex...)
+        → ở lại plain_url và tắt narrow.
+        """
+        driver.get(url)
+        self.url = url
+        if wait is None or wait() or not self.plain_url or url == self.plain_url:
+            return
+
+        driver.get(self.plain_url)
+        if wait():
+            self.narrow = False
+            self.url = self.plain_url
+            self.log(f">>> [control] narrowed query returned no rows, using plain URL {self.plain_url}")
+        else:
+            # cả hai đều trống (chưa có log) → giữ URL thu hẹp
+            driver.get(url)
+
+    # -------------------------------------------------
+    # HTTP
+    # -------------------------------------------------
+    def serve(self, port, host="127.0.0.1"):
+        ctl = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, code, data):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") in ("", "/state"):
+                    self._reply(200, ctl.state())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                try:
+                    n = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(n) or b"{}") if n else {}
+                    if not isinstance(body, dict):
+                        raise ValueError("body must be a JSON object")
+
+                    path = self.path.rstrip("/")
+                    if path == "/pause":
+                        ctl.set_paused(True)
+                    elif path == "/resume":
+                        ctl.set_paused(False)
+                    elif path == "/uids":
+                        ctl.set_uids(body.get("uids"), body.get("add", ()), body.get("remove", ()))
+                    elif path == "/reload":
+                        ctl.request_reload(body.get("mode", "soft"))
+                    else:
+                        self._reply(404, {"error": "not found"})
+                        return
+                except (ValueError, TypeError) as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, ctl.state())
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            # không có control vẫn phải crawl tiếp
+            self.log(f">>> [control] cannot bind {host}:{port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="control", daemon=True).start()
+        self.log(f">>> [control] listening on http://{host}:{port}")
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.shutdown()
+                self.server.server_close()
+            except:
+                pass
+            self.server = None
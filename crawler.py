@@ -1,21 +1,21 @@
 # crawler.py
-import time
 import json
 import os
 import re
-import datetime
-from prettytable import PrettyTable
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
 
+# selenium / bs4 / prettytable được import trong hàm dùng tới
+# → import crawler nhanh, restart nhanh
+from chrome_driver import start_driver as _start_chrome, StartupTimer
+from control import Control
 from discord_notify import send_discord, send_discord_weight
+from fingerprint import fingerprint, fingerprint_key, FingerprintSet, load_digests, save_digests
+from log_archive import LogArchive
+from outbox import Outbox
+from profiler import gauge
+from pipeline import (
+    Pipeline, Alert, RowParser, stage, dashboard_url,
+    grafana_source, extract, time_filter, dedup, archive, alert_sink,
+)
 
 FIRST_EMISSION = 60301
 
@@ -43,13 +43,36 @@ GRAFANA_URL = (
     "service-logs-only-for-validator-uid3d-1?orgId=1&refresh=5s"
 )
 
+# Loki line filter (regex) cho biến Search của dashboard: dòng global luôn lấy
+GLOBAL_SEARCH_PATTERNS = [
+    r"\[dcp\]\[upload\]",
+    r"_latest\.json",
+    r"creating checkpoint at global_step",
+    r"MEGA SLASH",
+    r"Updated scores for evaluated UIDs",
+]
+
 SENT_HISTORY_FILE = "sent_history.json"
+OUTBOX_FILE = "alert_outbox.jsonl"
 LAST_WEIGHT_FILE = "last_sent_window.json"
 
 
 # ==========================================================
 # UTILS
 # ==========================================================
+def search_regex(uids):
+    """Dòng nhắc tới UID được theo dõi (MEGA / lỗi) + checkpoint / MEGA / bảng weight."""
+    alts = []
+    if uids:
+        alts.append(r"UID\s+(" + "|".join(str(u) for u in sorted(uids)) + r")\b")
+    alts += GLOBAL_SEARCH_PATTERNS
+    return "(?i)" + "|".join(alts)
+
+
+def grafana_url(minutes, uids):
+    return dashboard_url(GRAFANA_URL, minutes, search_regex(uids))
+
+
 def load_last_sent_window():
     if not os.path.exists(LAST_WEIGHT_FILE):
         return None
@@ -66,21 +89,17 @@ def save_last_sent_window(w):
 
 
 def load_sent_history():
-    if not os.path.exists(SENT_HISTORY_FILE):
-        return set()
-    try:
-        with open(SENT_HISTORY_FILE, "r") as f:
-            return set(json.load(f).keys())
-    except:
-        return set()
+    # chỉ chứa digest; file định dạng cũ (chuỗi log đầy đủ) được tự chuyển đổi
+    return load_digests(SENT_HISTORY_FILE)
 
 
 def save_sent_history(h):
-    with open(SENT_HISTORY_FILE, "w") as f:
-        json.dump({k: True for k in h}, f)
+    save_digests(SENT_HISTORY_FILE, h)
 
 
 def print_table(data):
+    from prettytable import PrettyTable
+
     table = PrettyTable()
     table.field_names = ["UID", "Window", "Weight"]
     for uid, window, w in data:
@@ -88,22 +107,19 @@ def print_table(data):
     return table.get_string()
 
 
-def start_driver():
-    opts = webdriver.ChromeOptions()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--disable-features=WebExtensions")
-    opts.add_argument("--window-size=1920,4000")
-
-    return webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=opts
+def start_driver(gui_log=print):
+    return _start_chrome(
+        window_size="1920,4000",
+        extra_args=["--disable-features=WebExtensions"],
+        log=gui_log,
     )
 
 
 def wait_for_dom(driver, gui_log):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     try:
         WebDriverWait(driver, 12).until(
             EC.presence_of_element_located(
@@ -116,15 +132,6 @@ def wait_for_dom(driver, gui_log):
         return False
 
 
-def get_rows(driver):
-    try:
-        return driver.find_elements(
-            By.XPATH, "//tr[td[contains(@class,'logs-row__localtime')]]"
-        )
-    except:
-        return []
-
-
 # ==========================================================
 # PARSE WEIGHT TABLE
 # ==========================================================
@@ -162,206 +169,205 @@ def parse_weight_table(msg: str):
     return result
 
 
+# ==========================================================
+# STAGES
+# ==========================================================
+ERROR_PATTERNS = [
+    "negative eval frequency",
+    "avg_steps_behind=",
+    "No gradient gathered",
+    "Consecutive misses",
+    "Skipped score of UID",
+    "Skipped UID",
+    "Skipped reducing score of UID",
+    "No gradient received from",
+    "negative evaluations",
+    "consecutive negative evaluations",
+]
+
+
+def classify(batch):
+    """Gắn category (CHECKPOINT / MEGA / WEIGHT / ERROR) và UID trong message."""
+    for r in batch:
+        msg = r.msg
+        low = msg.lower()
+
+        if (
+            "[dcp][upload]" in low
+            or "_latest.json" in low
+            or "creating checkpoint at global_step" in low
+        ):
+            r.category = "CHECKPOINT"
+        elif "MEGA SLASH" in msg and "MEGA" in msg:
+            r.category = "MEGA"
+        elif "Updated scores for evaluated UIDs" in msg:
+            r.category = "WEIGHT"
+        elif any(p in msg for p in ERROR_PATTERNS):
+            r.category = "ERROR"
+        else:
+            continue
+
+        if r.category in ("MEGA", "ERROR"):
+            m = re.search(r"UID\s+(\d+)", msg)
+            r.uid = int(m.group(1)) if m else None
+    return batch
+
+
+def build_weight_alert(r, uids, last_sent_window):
+    """(Alert, window) cho bảng weight của window mới, hoặc (None, None)."""
+    parsed = parse_weight_table(r.msg)
+    if not parsed:
+        return None, None
+
+    raw_window = max(w for (w, _) in parsed.values())
+    real_window = raw_window + 1
+    emission = "Emission" if is_emission(real_window) else ""
+
+    if last_sent_window == real_window:
+        return None, None
+
+    rows_out = []
+    total = 0.0
+
+    for u in uids:
+        if u not in parsed:
+            continue
+
+        _, wt = parsed[u]
+
+        if wt == 0:
+            continue
+
+        rows_out.append((u, raw_window, wt))
+        total += wt
+
+    if not rows_out:
+        return None, None
+
+    table_str = print_table(rows_out)
+    content = (
+        f"```\nWindow = {real_window} {emission}\n"
+        f"{table_str}\nTotal = {total:.4f}\n```"
+    )
+    # key theo window: crash sau commit outbox nhưng trước khi lưu
+    # last_sent_window → lần chạy sau bị sent_history / outbox chặn, không gửi trùng
+    return Alert(fingerprint(real_window, "", "WEIGHT"), "weight", content, r), real_window
+
+
+def alerts(uids):
+    """LogRecord đã phân loại → Alert (checkpoint global, MEGA/ERROR theo UID, weight mỗi window)."""
+    def run(batches):
+        last_sent_window = load_last_sent_window()
+
+        for batch in batches:
+            out = []
+            for r in batch:
+                cat = r.category
+
+                if cat == "CHECKPOINT":
+                    out.append(Alert(fingerprint_key(r.fp, cat), "main", f"[CHECKPOINT] {r.msg}", r))
+
+                elif cat == "MEGA" and r.uid in uids:
+                    out.append(Alert(fingerprint_key(r.fp, cat), "main", f"[MEGA] {r.msg}", r))
+
+                elif cat == "ERROR" and r.uid in uids:
+                    out.append(Alert(fingerprint_key(r.fp, cat), "main", f"[UID {r.uid}] {r.msg}", r))
+
+                elif cat == "WEIGHT":
+                    alert, window = build_weight_alert(r, uids, last_sent_window)
+                    if alert:
+                        # lưu file sau khi sink đã fsync alert vào outbox:
+                        # crash ở giữa thì window chưa bị đánh dấu là đã gửi
+                        alert.on_commit = lambda w=window: save_last_sent_window(w)
+                        out.append(alert)
+                        last_sent_window = window
+            yield out
+    return run
+
+
 # ==========================================================
 # MAIN CRAWLER
 # ==========================================================
-def run_crawler(minutes, gui_log, should_run, paused_flag):
+def run_crawler(minutes, gui_log, should_run, paused_flag, parse_workers=1,
+                archive_dir="archive/crawler", control_port=0, narrow=True, heartbeat=None):
+
+    # heartbeat(rows, scraped, paused) → báo cho supervisor là vòng lặp vẫn chạy
+    beat = heartbeat or (lambda rows=0, scraped=0, paused=False: None)
+    startup = StartupTimer(gui_log)
+
+    # UID set đổi được lúc chạy qua control endpoint (sửa list tại chỗ)
+    uids = list(FIXED_UIDS)
+    control = Control("crawler", uids, cast=int, port=control_port, log=gui_log)
+    control.plain_url = GRAFANA_URL
+    control.narrow = narrow
+
+    def dashboard():
+        return grafana_url(minutes, uids) if control.narrow else GRAFANA_URL
 
     gui_log(">>> Starting Chrome…")
-    driver = start_driver()
+    driver = start_driver(gui_log)
+    startup.mark("chrome")
+    beat()
 
     gui_log(">>> Loading Grafana…")
-    driver.get(GRAFANA_URL)
-    time.sleep(4)
-    wait_for_dom(driver, gui_log)
+    # time range + regex UID được đẩy xuống Grafana → Chrome chỉ render dòng cần dùng;
+    # wait_for_dom đã chờ tới khi có dòng log → không cần sleep cố định
+    wait = lambda: wait_for_dom(driver, gui_log)
+    control.open(driver, dashboard(), wait)
+    startup.mark("grafana")
+    beat()
 
     gui_log(">>> Monitoring started.")
 
-    sent_history = load_sent_history()
-    last_sent_window = load_last_sent_window()
-    seen = {}
-    time_range = datetime.timedelta(minutes=minutes)
+    def on_new(r):
+        startup.first_row()
+        beat(1)
+        gui_log(r.msg, category="row")
 
     # ==========================================================
-    # MAIN LOOP
+    # STAGE GRAPH
+    # source → extract → time filter → dedup → [archive] → classify → alerts → sink
     # ==========================================================
-    while should_run():
-
-        if paused_flag():
-            time.sleep(0.5)
-            continue
-
-        now = datetime.datetime.now()
+    seen = FingerprintSet()
+    # outbox: alert chưa gửi xong lần trước được gửi lại ngay khi mở
+    outbox = Outbox(OUTBOX_FILE, {"main": send_discord, "weight": send_discord_weight}, gui_log)
+    sent_history = load_sent_history()
+    for k in outbox.keys():
+        sent_history.add(k)
+    gauge("seen", lambda: len(seen))
+    gauge("sent_history", lambda: len(sent_history))
+    gauge("outbox_pending", lambda: len(outbox))
+
+    stages = [
+        ("extract", extract(RowParser(workers=parse_workers))),
+        ("time_filter", time_filter(minutes)),
+        ("dedup", dedup(seen, minutes, on_new)),
+    ]
+    if archive_dir:
+        stages.append(("archive", archive(LogArchive(archive_dir))))
+
+    pipe = Pipeline(
+        grafana_source(
+            driver, should_run, lambda: paused_flag() or control.paused, beat,
+            interval=5.0,
+            before_cycle=lambda: control.before_cycle(driver, dashboard, wait),
+        ),
+        stages + [
+            ("classify", stage(classify)),
+            ("alerts", alerts(uids)),
+            ("sink", alert_sink(outbox, sent_history, save_sent_history, gui_log)),
+        ],
+        log=gui_log,
+    )
+    control.stats = pipe.report
 
+    try:
+        pipe.run()
+    finally:
+        control.close()
+        outbox.close()
+        gui_log(pipe.report())
         try:
-            driver.execute_script(
-                "window.scrollTo(0, document.body.scrollHeight);"
-            )
+            driver.quit()
         except:
             pass
-
-        rows = get_rows(driver)
-        if not rows:
-            time.sleep(1)
-            continue
-
-        logs = []
-
-        # ----------------------------------------------------------
-        # Extract logs
-        # ----------------------------------------------------------
-        for row in rows:
-            try:
-                html = row.get_attribute("innerHTML")
-            except:
-                continue
-
-            soup = BeautifulSoup(html, "html.parser")
-            tds = soup.find_all("td")
-            if len(tds) < 5:
-                continue
-
-            ts = tds[2].get_text(strip=True)
-
-            try:
-                log_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f")
-            except:
-                try:
-                    log_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                except:
-                    continue
-
-            if now - log_time > time_range:
-                continue
-
-            msg = tds[4].get_text("\n", strip=False)
-            uniq = ts + "|" + msg
-
-            logs.append((log_time, uniq, msg))
-
-        logs.sort(key=lambda x: x[0])
-
-        # ==========================================================
-        # PROCESS LOGS
-        # ==========================================================
-        for (log_time, uniq, msg) in logs:
-
-            if uniq not in seen:
-                gui_log(msg)
-                seen[uniq] = now
-
-            # ======================================================
-            # CHECKPOINT (global, send once)
-            # ======================================================
-            if (
-                "[dcp][upload]" in msg.lower()
-                or "_latest.json" in msg.lower()
-                or "creating checkpoint at global_step" in msg.lower()
-            ):
-                key = f"CHECKPOINT|{uniq}"
-                if key not in sent_history:
-                    send_discord(f"[CHECKPOINT] {msg}")
-                    sent_history.add(key)
-                    save_sent_history(sent_history)
-                continue
-
-            # ======================================================
-            # MEGA SLASH
-            # ======================================================
-            if "MEGA SLASH" in msg and "MEGA" in msg:
-
-                m = re.search(r"UID\s+(\d+)", msg)
-                mega_uid = int(m.group(1)) if m else None
-
-                if mega_uid in FIXED_UIDS:
-                    key = f"MEGA|{uniq}"
-
-                    if key not in sent_history:
-                        send_discord(f"[MEGA] {msg}")
-                        sent_history.add(key)
-                        save_sent_history(sent_history)
-
-                continue
-
-            # ======================================================
-            # ERROR FILTER
-            # ======================================================
-            error_patterns = [
-                "negative eval frequency",
-                "avg_steps_behind=",
-                "No gradient gathered",
-                "Consecutive misses",
-                "Skipped score of UID",
-                "Skipped UID",
-                "Skipped reducing score of UID",
-                "No gradient received from",
-                "negative evaluations",
-                "consecutive negative evaluations",
-            ]
-
-            if any(p in msg for p in error_patterns):
-
-                m = re.search(r"UID\s+(\d+)", msg)
-                eval_uid = int(m.group(1)) if m else None
-
-                if eval_uid in FIXED_UIDS:
-                    if uniq not in sent_history:
-                        send_discord(f"[UID {eval_uid}] {msg}")
-                        sent_history.add(uniq)
-                        save_sent_history(sent_history)
-
-            # ======================================================
-            # WEIGHT BLOCK – send once per new window
-            # ======================================================
-            if "Updated scores for evaluated UIDs" in msg:
-
-                parsed = parse_weight_table(msg)
-                if not parsed:
-                    continue
-
-                raw_window = max(w for (w, _) in parsed.values())
-                real_window = raw_window + 1
-                emission = "Emission" if is_emission(real_window) else ""
-
-                if last_sent_window == real_window:
-                    continue
-
-                rows_out = []
-                total = 0.0
-
-                for u in FIXED_UIDS:
-                    if u not in parsed:
-                        continue
-
-                    _, wt = parsed[u]
-
-                    if wt == 0:
-                        continue
-
-                    rows_out.append((u, raw_window, wt))
-                    total += wt
-
-                if not rows_out:
-                    continue
-
-                table_str = print_table(rows_out)
-                send_discord_weight(
-                    f"```\nWindow = {real_window} {emission}\n"
-                    f"{table_str}\nTotal = {total:.4f}\n```"
-                )
-
-                last_sent_window = real_window
-                save_last_sent_window(real_window)
-
-        # cleanup seen logs
-        old = [k for k, t in seen.items() if now - t > time_range]
-        for k in old:
-            del seen[k]
-
-        time.sleep(5)
-
-    # shutdown
-    try:
-        driver.quit()
-    except:
-        pass
\ No newline at end of file
@@ -1,13 +1,17 @@
 import time
 import re
-import json
-import os
-import datetime
-import shutil
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
+# selenium / bs4 chỉ được import khi mở Chrome / parse dòng
+from chrome_driver import start_driver as _start_chrome, find_chrome_binary, StartupTimer
+from control import Control
 from discord_notify_templar_scores import send_discord1
+from fingerprint import fingerprint, FingerprintSet, load_digests, save_digests
+from log_archive import LogArchive
+from outbox import Outbox
+from profiler import gauge
+from pipeline import (
+    Pipeline, Alert, RowParser, stage, dashboard_url,
+    grafana_source, wait_for_rows, extract, time_filter, dedup, archive, alert_sink,
+)
 
 # ============================================================
 # CONFIG
@@ -25,7 +29,14 @@ TEMPLAR_KEYS = [
     "Computed Final Score"
 ]
 
+# Loki line filter cho biến Search: chỉ các dòng điểm. UID là label eval_uid,
+# không nằm trong nội dung dòng → vẫn lọc ở stage select.
+SEARCH_REGEX = "(?i)" + "|".join(TEMPLAR_KEYS)
+
+ROWS_XPATH = "//tr[contains(@class,'logs-row')]"
+
 HISTORY_FILE = "templar_score_history.json"
+OUTBOX_FILE = "templar_score_outbox.jsonl"
 
 # Thời gian chờ trước khi chốt 1 window
 WINDOW_DELAY_SECONDS = 60 * 15  # 10 phút
@@ -40,65 +51,28 @@ def is_emission(window):
     except:
         return False
 
+def history_key(window):
+    return fingerprint(window, "", "TEMPLAR_SCORES")
+
 def load_history():
-    try:
-        with open(HISTORY_FILE, "r") as f:
-            return set(json.load(f).keys())
-    except:
-        return set()
+    # định dạng cũ: {"Templar scores|<window>": true}
+    return load_digests(HISTORY_FILE, legacy=lambda k: history_key(k.partition("|")[2]))
 
 def save_history(h):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump({k: True for k in h}, f)
-
-
-def start_driver():
-    opts = webdriver.ChromeOptions()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1920,3000")
-    opts.add_argument("--disable-blink-features=AutomationControlled")
-
-    # ============================
-    # WINDOWS
-    # ============================
-    # if os.name == "nt":
-    #     # thử tìm chrome.exe
-    #     win_candidates = [
-    #         r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-    #         r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-    #         shutil.which("chrome"),
-    #         shutil.which("google-chrome"),
-    #         shutil.which("chrome.exe"),
-    #         shutil.which("google-chrome.exe")
-    #     ]
-
-    #     for p in win_candidates:
-    #         if p and os.path.exists(p):
-    #             opts.binary_location = p
-    #             return webdriver.Chrome(options=opts)
-
-    #     raise FileNotFoundError("❌ Windows: Chrome not found. Cài Google Chrome trước!")
-
-    # ============================
-    # LINUX
-    # ============================
-    linux_paths = [
-        "/usr/bin/google-chrome",
-        "/usr/bin/chromium-browser",
-        "/usr/bin/chromium",
-        "/snap/bin/chromium",
-        shutil.which("chromium"),
-        shutil.which("google-chrome"),
-    ]
-    for p in linux_paths:
-        if p and os.path.exists(p):
-            opts.binary_location = p
-            return webdriver.Chrome(options=opts)
+    save_digests(HISTORY_FILE, h)
 
-    raise FileNotFoundError("❌ Chrome/Chromium not found on system.")
+
+def start_driver(gui_log=print):
+    binary = find_chrome_binary()
+    if not binary:
+        raise FileNotFoundError("❌ Chrome/Chromium not found on system.")
+
+    return _start_chrome(
+        window_size="1920,3000",
+        extra_args=["--disable-blink-features=AutomationControlled"],
+        binary=binary,
+        log=gui_log,
+    )
 
 
 
@@ -106,10 +80,7 @@ def start_driver():
 # REPORT BUILDER
 # ============================================================
 
-def build_and_send(window, data, uids, delayed_for_window, delayed_window, sent_history):
-    uniq = f"Templar scores|{window}"
-    if uniq in sent_history:
-        return
+def build_report(window, data, uids, delayed_for_window, delayed_window):
     emission = "Emission" if is_emission(window) else ""
     report = f"Window: {window} {emission}\n\n"
 
@@ -148,169 +119,225 @@ def build_and_send(window, data, uids, delayed_for_window, delayed_window, sent_
                 f"Computed final score: {computed}\n\n"
             )
 
-    send_discord1(f"```\n{report}\n```")
-    sent_history.add(uniq)
-    save_history(sent_history)
+    return f"```\n{report}\n```"
 
 
 # ============================================================
-# MAIN CRAWLER
+# STAGES
 # ============================================================
 
-def run_crawler_templar_scores(uids, minutes, gui_log, should_run, is_paused):
+def select_uids(uids):
+    """Chỉ giữ dòng có eval_uid được theo dõi và có current_window."""
+    def fn(batch):
+        return [r for r in batch if r.uid in uids and r.window]
+    return stage(fn)
+
+
+def window_scores(uids):
+    """
+    Gom điểm theo window → uid; window đã thấy quá WINDOW_DELAY_SECONDS
+    thì chốt thành một Alert báo cáo. Chạy cả với batch rỗng (tick).
+    """
+    def run(batches):
+        TEMPLAR_ALL = {}        # window → uid → data
+        WINDOW_TIME = {}        # window → first seen timestamp
+        DELAYED = {}            # window → uid → data
+
+        current_window = None
+
+        gauge("TEMPLAR_ALL windows", lambda: len(TEMPLAR_ALL))
+        gauge("TEMPLAR_ALL entries", lambda: sum(len(v) for v in TEMPLAR_ALL.values()))
+        gauge("WINDOW_TIME", lambda: len(WINDOW_TIME))
+        gauge("DELAYED", lambda: len(DELAYED))
+
+        for batch in batches:
+            now = time.time()
+            out = []
+
+            # ====================================================
+            # CHECK WINDOW READY TO SEND (timeout)
+            # ====================================================
+            finished = []
+            for win, first_time in WINDOW_TIME.items():
+                if now - first_time >= WINDOW_DELAY_SECONDS:
+                    finished.append(win)
+
+            for win in finished:
+                out.append(Alert(
+                    history_key(win),
+                    "scores",
+                    build_report(
+                        window=win,
+                        data=TEMPLAR_ALL.get(win, {}),
+                        uids=uids,
+                        delayed_for_window=DELAYED.get(win, {}),
+                        delayed_window=win,
+                    ),
+                ))
+
+                if win in TEMPLAR_ALL:
+                    del TEMPLAR_ALL[win]
+                if win in DELAYED:
+                    del DELAYED[win]
+                if win in WINDOW_TIME:
+                    del WINDOW_TIME[win]
+
+            # ====================================================
+            # NEW LOG LINES
+            # ====================================================
+            for r in batch:
+                window = r.window
+                eval_uid = r.uid
+                msg = r.msg
+
+                # ghi thời điểm xuất hiện window
+                if window not in WINDOW_TIME:
+                    WINDOW_TIME[window] = now
+
+                # --- detect window switching ---
+                if current_window is None:
+                    current_window = window
+                    prev_window = None
+
+                elif window != current_window:
+                    prev_window = current_window
+
+                else:
+                    prev_window = None
+
+                # --- logs arriving late for previous window ---
+                if prev_window is not None and window == prev_window:
+                    if prev_window not in DELAYED:
+                        DELAYED[prev_window] = {}
+
+                    if eval_uid not in DELAYED[prev_window]:
+                        DELAYED[prev_window][eval_uid] = {}
+
+                    if "Sync average" in msg:
+                        DELAYED[prev_window][eval_uid]["sync"] = msg.split(":", 1)[1].strip()
+
+                    elif "Binary Moving" in msg:
+                        DELAYED[prev_window][eval_uid]["binary"] = msg.split(":", 1)[1].strip()
+
+                    elif "Gradient Score" in msg:
+                        m = re.search(r"Gradient Score[:\s]+(.+)", msg)
+                        if m:
+                            DELAYED[prev_window][eval_uid]["gradient"] = m.group(1).strip()
+                    elif "Computed final score" in msg:
+                        DELAYED[prev_window][eval_uid]["computed"] = msg.split(":", 1)[1].strip()
+
+                # Sau khi xử lý delayed → Bây giờ mới cập nhật current_window
+                if prev_window is not None:
+                    current_window = window
+
+                # --- normal logs (current window) ---
+                if any(k in msg for k in TEMPLAR_KEYS):
+
+                    bucket = TEMPLAR_ALL.setdefault(window, {})
+                    uidbucket = bucket.setdefault(eval_uid, {})
+
+                    if "Sync average" in msg:
+                        uidbucket["sync"] = msg.split(":", 1)[1].strip()
+
+                    elif "Binary Moving" in msg:
+                        uidbucket["binary"] = msg.split(":", 1)[1].strip()
+
+                    elif "Gradient Score" in msg:
+                        m = re.search(r"Gradient Score[:\s]+(.+)", msg)
+                        if m:
+                            uidbucket["gradient"] = m.group(1).strip()
+                    elif "Computed Final Score" in msg:
+                        uidbucket["computed"] = msg.split(":", 1)[1].strip()
+
+            yield out
+    return run
+
+
+def record_key(r):
+    """Digest dedup gồm cả UID + window (r.fp chỉ có ts + msg)."""
+    return fingerprint(r.ts, r.msg, f"{r.uid}|{r.window}")
 
-    uids = [str(u) for u in uids]
-    gui_log(f"[TemplarScores] Monitoring: {uids}")
 
-    sent_history = load_history()
-    driver = start_driver()
-    driver.get(GRAFANA_URL)
+# ============================================================
+# MAIN CRAWLER
+# ============================================================
 
-    time_range = datetime.timedelta(minutes=minutes)
+def run_crawler_templar_scores(uids, minutes, gui_log, should_run, is_paused,
+                               archive_dir="archive/templar_scores", control_port=0,
+                               narrow=True, heartbeat=None):
 
-    TEMPLAR_ALL = {}        # window → uid → data
-    WINDOW_TIME = {}        # window → first seen timestamp
-    DELAYED = {}            # window → uid → data
+    # heartbeat(rows, scraped, paused) → báo cho supervisor là vòng lặp vẫn chạy
+    beat = heartbeat or (lambda rows=0, scraped=0, paused=False: None)
+    startup = StartupTimer(gui_log)
 
-    current_window = None
+    uids = [str(u) for u in uids]
+    control = Control("templar_scores", uids, cast=str, port=control_port, log=gui_log)
+    control.plain_url = GRAFANA_URL
+    control.narrow = narrow
 
-    while should_run():
+    def dashboard():
+        return dashboard_url(GRAFANA_URL, minutes, SEARCH_REGEX) if control.narrow else GRAFANA_URL
+    gui_log(f"[TemplarScores] Monitoring: {uids}")
 
-        if is_paused():
-            time.sleep(0.3)
-            continue
+    driver = start_driver(gui_log)
+    startup.mark("chrome")
+    beat()
+    wait = lambda: wait_for_rows(driver, ROWS_XPATH)
+    control.open(driver, dashboard(), wait)
+    startup.mark("grafana")
+    beat()
+
+    def on_new(r):
+        startup.first_row()
+        beat(1)
+        gui_log(r.msg, uid=r.uid, window=r.window, category="score")
+
+    # ====================================================
+    # STAGE GRAPH
+    # source → extract → time filter → select → dedup → [archive] → aggregate → sink
+    # ====================================================
+    seen = FingerprintSet()
+    # outbox: báo cáo chưa gửi xong lần trước được gửi lại ngay khi mở
+    outbox = Outbox(OUTBOX_FILE, {"scores": send_discord1}, gui_log)
+    sent_history = load_history()
+    for k in outbox.keys():
+        sent_history.add(k)
+    gauge("seen", lambda: len(seen))
+    gauge("sent_history", lambda: len(sent_history))
+    gauge("outbox_pending", lambda: len(outbox))
+
+    stages = [
+        ("extract", extract(RowParser(msg_sep="", msg_strip=True))),
+        ("time_filter", time_filter(minutes)),
+        ("select", select_uids(uids)),
+        # cùng ts + msg ở UID / window khác nhau là hai dòng khác nhau
+        ("dedup", dedup(seen, minutes, on_new, key=record_key)),
+    ]
+    if archive_dir:
+        stages.append(("archive", archive(LogArchive(archive_dir))))
+
+    pipe = Pipeline(
+        grafana_source(
+            driver, should_run, lambda: is_paused() or control.paused, beat,
+            xpath=ROWS_XPATH,
+            interval=0.5, idle_interval=0.5, pause_interval=0.3,
+            before_cycle=lambda: control.before_cycle(driver, dashboard, wait),
+        ),
+        stages + [
+            ("aggregate", window_scores(uids)),
+            ("sink", alert_sink(outbox, sent_history, save_history, gui_log)),
+        ],
+        log=gui_log,
+    )
+    control.stats = pipe.report
 
+    try:
+        pipe.run()
+    finally:
+        control.close()
+        outbox.close()
+        gui_log(pipe.report())
         try:
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            driver.quit()
         except:
             pass
-
-        rows = driver.find_elements(By.XPATH, "//tr[contains(@class,'logs-row')]")
-        now = time.time()
-
-        # ====================================================
-        # CHECK WINDOW READY TO SEND (timeout)
-        # ====================================================
-        finished = []
-        for win, first_time in WINDOW_TIME.items():
-            if now - first_time >= WINDOW_DELAY_SECONDS:
-                finished.append(win)
-
-        for win in finished:
-            build_and_send(
-                window=win,
-                data=TEMPLAR_ALL.get(win, {}),
-                uids=uids,
-                delayed_for_window=DELAYED.get(win, {}),
-                delayed_window=win,
-                sent_history=sent_history
-            )
-
-            if win in TEMPLAR_ALL:
-                del TEMPLAR_ALL[win]
-            if win in DELAYED:
-                del DELAYED[win]
-            if win in WINDOW_TIME:
-                del WINDOW_TIME[win]
-
-        # ====================================================
-        # PARSE NEW LOG LINES
-        # ====================================================
-        for row in rows:
-            try:
-                html = row.get_attribute("innerHTML")
-            except:
-                continue
-
-            soup = BeautifulSoup(html, "html.parser")
-            tds = soup.find_all("td")
-            if len(tds) < 5:
-                continue
-
-            ts_raw = tds[2].get_text(strip=True)
-            try:
-                ts = datetime.datetime.strptime(ts_raw, "%Y-%m-%d %H:%M:%S.%f")
-            except:
-                continue
-
-            if datetime.datetime.now() - ts > time_range:
-                continue
-
-            window = None
-            eval_uid = None
-
-            for sp in tds[3].find_all("span"):
-                title = sp.get("title", "")
-                if "current_window:" in title:
-                    window = title.split(":", 1)[1].strip()
-                elif "eval_uid:" in title:
-                    eval_uid = title.split(":", 1)[1].strip()
-
-            if eval_uid not in uids or not window:
-                continue
-
-            msg = tds[4].get_text(strip=True)
-            gui_log(f"[{window}] [UID {eval_uid}] {msg}")
-
-            # ghi thời điểm xuất hiện window
-            if window not in WINDOW_TIME:
-                WINDOW_TIME[window] = now
-
-            # --- detect window switching ---
-            if current_window is None:
-                current_window = window
-                prev_window = None
-
-            elif window != current_window:
-                prev_window = current_window
-
-            else:
-                prev_window = None
-
-            # --- logs arriving late for previous window ---
-            if prev_window is not None and window == prev_window:
-                if prev_window not in DELAYED:
-                    DELAYED[prev_window] = {}
-
-                if eval_uid not in DELAYED[prev_window]:
-                    DELAYED[prev_window][eval_uid] = {}
-
-                if "Sync average" in msg:
-                    DELAYED[prev_window][eval_uid]["sync"] = msg.split(":", 1)[1].strip()
-
-                elif "Binary Moving" in msg:
-                    DELAYED[prev_window][eval_uid]["binary"] = msg.split(":", 1)[1].strip()
-
-                elif "Gradient Score" in msg:
-                    m = re.search(r"Gradient Score[:\s]+(.+)", msg)
-                    if m:
-                        DELAYED[prev_window][eval_uid]["gradient"] = m.group(1).strip()
-                elif "Computed final score" in msg:
-                    DELAYED[prev_window][eval_uid]["computed"] = msg.split(":", 1)[1].strip()
-
-            # Sau khi xử lý delayed → Bây giờ mới cập nhật current_window
-            if prev_window is not None:
-                current_window = window
-
-            # --- normal logs (current window) ---
-            if any(k in msg for k in TEMPLAR_KEYS):
-
-                bucket = TEMPLAR_ALL.setdefault(window, {})
-                uidbucket = bucket.setdefault(eval_uid, {})
-
-                if "Sync average" in msg:
-                    uidbucket["sync"] = msg.split(":", 1)[1].strip()
-
-                elif "Binary Moving" in msg:
-                    uidbucket["binary"] = msg.split(":", 1)[1].strip()
-
-                elif "Gradient Score" in msg:
-                    m = re.search(r"Gradient Score[:\s]+(.+)", msg)
-                    if m:
-                        uidbucket["gradient"] = m.group(1).strip()
-                elif "Computed Final Score" in msg:
-                    uidbucket["computed"] = msg.split(":", 1)[1].strip()
-
-        time.sleep(0.5)
-
-    driver.quit()
\ No newline at end of file
@@ -1,13 +1,50 @@
 # discord_notify.py
 import requests
 
+from outbox import PermanentError, RetryAfter
+
 DISCORD_WEBHOOK_URL = "https://discord.com/api/webhooks/1439689052918907092/DNBc4cwG9hIcvDpDQEjsl4Jwo-TtK2XC-S7ZcpxuVlKMKsoOauJTB_Nan-FlQxtQ7JlK"
 
-def send_discord(message: str):
-    if not DISCORD_WEBHOOK_URL:
-        return
+# True = webhook trả 2xx (outbox chỉ đánh dấu done khi True), False = lỗi tạm thời.
+# 429 → RetryAfter; chỉ 400 / 413 (nội dung sai, > 2000 ký tự...) → PermanentError.
+# 401 / 403 / 404 là lỗi cấu hình webhook (token bị thu hồi, URL sai) chứ không
+# phải lỗi của alert → False để outbox thử lại với backoff, in cảnh báo rõ ràng.
+def post_webhook(url, message):
+    if not url:
+        return True     # chưa cấu hình webhook → không có gì để gửi lại
     try:
-        requests.post(DISCORD_WEBHOOK_URL, json={"content": message}, timeout=5)
+        r = requests.post(url, json={"content": message}, timeout=5)
     except Exception as e:
         print("Discord error:", e)
+        return False
+
+    if 200 <= r.status_code < 300:
+        return True
+    if r.status_code == 429:
+        try:
+            seconds = float(r.json().get("retry_after"))
+        except:
+            try:
+                seconds = float(r.headers.get("Retry-After"))
+            except:
+                seconds = 5.0
+        raise RetryAfter(seconds)
+    if r.status_code in (400, 413):
+        raise PermanentError(f"HTTP {r.status_code}: {r.text[:200]}")
+    if r.status_code in (401, 403, 404):
+        print(f"!!! Discord webhook rejected (HTTP {r.status_code}), check the webhook URL: {r.text[:200]}",
+              flush=True)
+        return False
+    print("Discord error: HTTP", r.status_code)
+    return False
+
+
+def send_discord(message: str):
+    return post_webhook(DISCORD_WEBHOOK_URL, message)
+
+
+# crawler.py gửi bảng weight qua hàm này (trước đây thiếu → ImportError)
+DISCORD_WEIGHT_WEBHOOK_URL = DISCORD_WEBHOOK_URL
 
+def send_discord_weight(message: str):
+    return post_webhook(DISCORD_WEIGHT_WEBHOOK_URL, message)
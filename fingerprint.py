@@ -0,0 +1,159 @@
+# fingerprint.py
+import os
+import json
+import hashlib
+from array import array
+
+# Dedup key = digest 64-bit của (category, timestamp, message đã chuẩn hoá)
+# thay vì chuỗi "ts|msg" đầy đủ (bảng weight dài vài KB).
+# 64-bit: xác suất trùng với 1M key ≈ 3e-8. Độ rộng cố định: FingerprintSet
+# lưu array('Q'), fingerprint_key và file digest đều giả định 8 byte.
+
+
+# =====================================================
+# DIGESTS
+# =====================================================
+def normalize(msg):
+    # gộp khoảng trắng → cùng một dòng log render khác nhau vẫn cùng key
+    return " ".join(msg.split())
+
+
+def fingerprint(ts, msg, category=""):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(f"{category}\x1f{ts}\x1f{normalize(msg)}".encode("utf-8", "replace"))
+    # 0 là slot trống trong FingerprintSet
+    return int.from_bytes(h.digest(), "little") or 1
+
+
+def fingerprint_key(fp, category):
+    """Key cho một loại alert (CHECKPOINT, MEGA, ERROR...) từ digest gốc."""
+    h = hashlib.blake2b(fp.to_bytes(8, "little"), digest_size=8, person=category.encode()[:16])
+    return int.from_bytes(h.digest(), "little") or 1
+
+
+def legacy_key(key):
+    """Chuyển key chuỗi cũ trong sent_history.json sang digest."""
+    category = "ERROR"
+    for prefix in ("CHECKPOINT", "MEGA"):
+        if key.startswith(prefix + "|"):
+            category = prefix
+            key = key[len(prefix) + 1:]
+            break
+    ts, _, msg = key.partition("|")
+    return fingerprint_key(fingerprint(ts, msg), category)
+
+
+# =====================================================
+# ARRAY-BACKED SET
+# =====================================================
+class FingerprintSet:
+    """
+    Set các digest 64-bit dùng open addressing trên array('Q'),
+    kèm array('d') lưu thời điểm (cho expire theo tuổi như `seen`).
+    ~16 byte/slot thay vì cả chuỗi log + object Python mỗi key.
+    """
+
+    def __init__(self, items=(), capacity=1024):
+        size = 16
+        while size < capacity * 2:
+            size *= 2
+        self._alloc(size)
+        for fp in items:
+            self.add(fp)
+
+    def _alloc(self, size):
+        self.keys = array("Q", bytes(8 * size))
+        self.stamps = array("d", bytes(8 * size))
+        self.mask = size - 1
+        self.n = 0
+
+    def _slot(self, fp):
+        keys = self.keys
+        mask = self.mask
+        i = fp & mask
+        while True:
+            k = keys[i]
+            if k == fp or k == 0:
+                return i
+            i = (i + 1) & mask
+
+    # -------------------------------------------------
+    def add(self, fp, stamp=0.0):
+        i = self._slot(fp)
+        if self.keys[i] == 0:
+            self.keys[i] = fp
+            self.n += 1
+            if self.n * 10 > len(self.keys) * 7:
+                self.stamps[i] = stamp
+                self._rebuild(len(self.keys) * 2)
+                return
+        self.stamps[i] = stamp
+
+    def get(self, fp, default=None):
+        i = self._slot(fp)
+        return self.stamps[i] if self.keys[i] == fp else default
+
+    def __contains__(self, fp):
+        return self.keys[self._slot(fp)] == fp
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return (k for k in self.keys if k)
+
+    def items(self):
+        return ((k, s) for k, s in zip(self.keys, self.stamps) if k)
+
+    def expire(self, cutoff):
+        """Bỏ mọi key có stamp < cutoff (rebuild một lần, không tombstone)."""
+        live = [(k, s) for k, s in self.items() if s >= cutoff]
+        if len(live) == self.n:
+            return 0
+        removed = self.n - len(live)
+        size = 16
+        while size < len(live) * 2:
+            size *= 2
+        self._alloc(max(size, 16))
+        for k, s in live:
+            self.add(k, s)
+        return removed
+
+    def _rebuild(self, size):
+        old = list(self.items())
+        self._alloc(size)
+        for k, s in old:
+            i = self._slot(k)
+            self.keys[i] = k
+            self.stamps[i] = s
+        self.n = len(old)
+
+
+# =====================================================
+# PERSISTENCE (chỉ lưu digest)
+# =====================================================
+def load_digests(path, legacy=legacy_key):
+    s = FingerprintSet()
+    if not os.path.exists(path):
+        return s
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except:
+        return s
+
+    if isinstance(data, dict) and "digests" in data:
+        for h in data["digests"]:
+            s.add(int(h, 16))
+    elif isinstance(data, dict):
+        # định dạng cũ {"ts|msg": true, ...}
+        for k in data:
+            s.add(legacy(k))
+    return s
+
+
+def save_digests(path, fps):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": 2, "digests": [f"{k:016x}" for k in fps]}, f)
+    os.replace(tmp, path)
@@ -0,0 +1,322 @@
+# loadtest.py
+# End-to-end load test: trang Grafana giả + webhook Discord giả trên localhost.
+#   python loadtest.py --rates 5,20,50,100 --uids 33 --phase 60
+# Crawler thật (Chrome headless) đọc trang giả, alert đi tới webhook giả;
+# latency = thời điểm webhook nhận - timestamp của dòng log.
+import os
+import re
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import crawler
+import discord_notify
+
+
+PAGE = """<!doctype html>
+<html><head><title>fake grafana</title></head>
+<body>
+<table><tbody id="logs"></tbody></table>
+<script>
+let since = 0;
+const MAX_ROWS = %(max_rows)d;
+const tbody = document.getElementById("logs");
+function esc(s) {
+  return s.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+async function poll() {
+  try {
+    const r = await fetch("/rows?since=" + since);
+    const data = await r.json();
+    for (const row of data.rows) {
+      const tr = document.createElement("tr");
+      tr.className = "logs-row";
+      tr.innerHTML =
+        '<td class="logs-row__level"></td>' +
+        '<td class="logs-row__toggle-details"></td>' +
+        '<td class="logs-row__localtime">' + row.ts + '</td>' +
+        '<td class="logs-row__labels">' +
+          '<span title="eval_uid: ' + row.uid + '">' + row.uid + '</span>' +
+          '<span title="current_window: ' + row.window + '">' + row.window + '</span>' +
+        '</td>' +
+        '<td class="logs-row__message">' + esc(row.msg) + '</td>';
+      tbody.appendChild(tr);
+    }
+    since = data.next;
+    while (tbody.rows.length > MAX_ROWS) tbody.deleteRow(0);
+  } catch (e) {}
+  setTimeout(poll, %(poll_ms)d);
+}
+poll();
+</script>
+</body></html>
+"""
+
+
+# =====================================================
+# FAKE GRAFANA
+# =====================================================
+class FakeGrafana:
+    """Sinh dòng log với tốc độ `rate` dòng/s; trang HTML poll /rows để append."""
+
+    def __init__(self, uids, window=60450, max_rows=1000, poll_ms=250):
+        self.uids = uids
+        self.window = window
+        self.max_rows = max_rows
+        self.poll_ms = poll_ms
+
+        self.rows = []          # seq → dict
+        self.born = []          # seq → epoch của timestamp log
+        self.lock = threading.Lock()
+        self.rate = 0.0
+        self._stop = False
+
+        harness = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith("/rows"):
+                    m = re.search(r"since=(\d+)", self.path)
+                    since = int(m.group(1)) if m else 0
+                    with harness.lock:
+                        rows = harness.rows[since:]
+                        nxt = len(harness.rows)
+                    # trang chỉ giữ max_rows dòng → không cần gửi phần cũ hơn
+                    rows = rows[-harness.max_rows:]
+                    body = json.dumps({"rows": rows, "next": nxt}).encode()
+                    ctype = "application/json"
+                else:
+                    body = (PAGE % {"max_rows": harness.max_rows, "poll_ms": harness.poll_ms}).encode()
+                    ctype = "text/html; charset=utf-8"
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._generate, daemon=True).start()
+
+    def stop(self):
+        self._stop = True
+        self.server.shutdown()
+
+    def _generate(self):
+        next_at = time.time()
+        while not self._stop:
+            if self.rate <= 0:
+                time.sleep(0.05)
+                next_at = time.time()
+                continue
+
+            now = time.time()
+            while next_at <= now:
+                self._append(next_at)
+                next_at += 1.0 / self.rate
+            time.sleep(min(0.01, max(0.0, next_at - time.time())))
+
+    def _append(self, t):
+        with self.lock:
+            seq = len(self.rows)
+            uid = self.uids[seq % len(self.uids)]
+            ts = datetime.datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            self.rows.append({
+                "ts": ts,
+                "uid": uid,
+                "window": self.window,
+                "msg": f"Skipped score of UID {uid}: loadtest seq={seq}",
+            })
+            # crawler chỉ đọc tới millisecond → latency tính theo ts đã làm tròn
+            self.born.append(datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f").timestamp())
+        return seq
+
+
+# =====================================================
+# FAKE WEBHOOK
+# =====================================================
+class FakeWebhook:
+    def __init__(self):
+        self.arrivals = {}      # seq → epoch nhận
+        self.lock = threading.Lock()
+
+        hook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                now = time.time()
+                n = int(self.headers.get("Content-Length", 0))
+                try:
+                    content = json.loads(self.rfile.read(n)).get("content", "")
+                except:
+                    content = ""
+                m = re.search(r"seq=(\d+)", content)
+                if m:
+                    with hook.lock:
+                        hook.arrivals.setdefault(int(m.group(1)), now)
+                self.send_response(204)
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/webhook"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# =====================================================
+# REPORT
+# =====================================================
+BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 60, 120, float("inf")]
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return float("nan")
+    i = min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+def histogram(latencies):
+    counts = [0] * len(BUCKETS)
+    for v in latencies:
+        for i, b in enumerate(BUCKETS):
+            if v <= b:
+                counts[i] += 1
+                break
+    peak = max(counts) or 1
+    lines = []
+    lo = 0
+    for b, c in zip(BUCKETS, counts):
+        label = f"{lo:g}-{b:g}s" if b != float("inf") else f">{lo:g}s"
+        lines.append(f"    {label:>10} {c:7}  {'#' * int(40 * c / peak)}")
+        lo = b
+    return "\n".join(lines)
+
+
+def phase_report(rate, seqs, grafana, hook, duration):
+    with hook.lock:
+        arrivals = dict(hook.arrivals)
+    lat = sorted(arrivals[s] - grafana.born[s] for s in seqs if s in arrivals)
+    delivered = len(lat)
+    return {
+        "rate": rate,
+        "generated": len(seqs),
+        "delivered": delivered,
+        "throughput": delivered / duration if duration else 0.0,
+        "p50": percentile(lat, 50),
+        "p95": percentile(lat, 95),
+        "p99": percentile(lat, 99),
+        "max": lat[-1] if lat else float("nan"),
+        "latencies": lat,
+    }
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="5,20,50,100", help="dòng log/s cho từng phase")
+    parser.add_argument("--uids", type=int, default=33, help="số UID được theo dõi")
+    parser.add_argument("--phase", type=int, default=60, help="số giây mỗi phase")
+    parser.add_argument("--drain", type=int, default=30, help="chờ alert trễ sau mỗi phase")
+    parser.add_argument("--minutes", type=int, default=5)
+    parser.add_argument("--slo", type=float, default=30.0, help="p95 latency tối đa (s)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="số dòng tối đa trên trang")
+    parser.add_argument("--parse-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    uids = list(range(1, args.uids + 1))
+    grafana = FakeGrafana(uids, max_rows=args.max_rows)
+    hook = FakeWebhook()
+    grafana.start()
+    hook.start()
+
+    # trỏ crawler vào stand-in, chạy trong thư mục tạm để không đụng history thật
+    crawler.GRAFANA_URL = grafana.url
+    crawler.FIXED_UIDS[:] = uids
+    discord_notify.DISCORD_WEBHOOK_URL = hook.url
+    discord_notify.DISCORD_WEIGHT_WEBHOOK_URL = hook.url
+    os.chdir(tempfile.mkdtemp(prefix="loadtest-"))
+
+    running = [True]
+
+    def quiet_log(msg, **fields):
+        if str(msg).startswith(">>>"):
+            print(msg, flush=True)
+
+    t = threading.Thread(
+        target=crawler.run_crawler,
+        args=(args.minutes, quiet_log, lambda: running[0], lambda: False, args.parse_workers),
+        daemon=True,
+    )
+    t.start()
+
+    # chờ crawler sẵn sàng: một dòng mồi phải tới được webhook
+    print(">>> Waiting for crawler warm-up…", flush=True)
+    warm = grafana._append(time.time())
+    while warm not in hook.arrivals:
+        if not t.is_alive():
+            raise SystemExit("crawler died during warm-up")
+        time.sleep(0.5)
+
+    results = []
+    for rate in [float(r) for r in args.rates.split(",") if r.strip()]:
+        first = len(grafana.rows)
+        grafana.rate = rate
+        time.sleep(args.phase)
+        grafana.rate = 0
+        last = len(grafana.rows)
+        time.sleep(args.drain)
+
+        r = phase_report(rate, range(first, last), grafana, hook, args.phase)
+        results.append(r)
+        print(
+            f">>> rate {rate:g}/s: delivered {r['delivered']}/{r['generated']}  "
+            f"p50 {r['p50']:.2f}s  p95 {r['p95']:.2f}s  p99 {r['p99']:.2f}s  max {r['max']:.2f}s",
+            flush=True,
+        )
+
+    running[0] = False
+    t.join(timeout=30)
+    grafana.stop()
+    hook.stop()
+
+    print("\n================ LOAD TEST ================")
+    print(f"UIDs monitored: {args.uids}, phase {args.phase}s, SLO p95 <= {args.slo:g}s")
+    ceiling = None
+    for r in results:
+        ok = r["generated"] and r["delivered"] >= 0.99 * r["generated"] and r["p95"] <= args.slo
+        if ok:
+            ceiling = r["rate"]
+        print(
+            f"\nrate {r['rate']:g}/s  delivered {r['delivered']}/{r['generated']} "
+            f"({r['throughput']:.1f}/s)  {'OK' if ok else 'FALLING BEHIND'}"
+        )
+        print(histogram(r["latencies"]))
+
+    if ceiling is None:
+        print("\nSustained throughput ceiling: below the lowest tested rate")
+    else:
+        print(f"\nSustained throughput ceiling: >= {ceiling:g} lines/s")
+
+
+if __name__ == "__main__":
+    main()
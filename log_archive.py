@@ -0,0 +1,247 @@
+# log_archive.py
+# Lưu mọi dòng log đã ingest vào segment nén theo block + index sidecar.
+#   python log_archive.py query --dir archive/crawler --uid 204 --window 60450
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import queue
+import argparse
+import datetime
+import threading
+
+UID_RE = re.compile(r"UID\s+(\d+)")
+
+
+# =====================================================
+# WRITER
+# =====================================================
+class LogArchive:
+    """
+    append() chỉ đẩy vào queue; background thread gom `block_records` dòng
+    (hoặc sau `flush_interval` giây) thành một block zlib, ghi nối vào
+    segment `seg-<epoch>.dat` và ghi một dòng index vào `seg-<epoch>.idx`:
+        {"off", "len", "n", "t0", "t1", "uids", "windows"}
+    Query chỉ giải nén các block có index khớp.
+    """
+
+    def __init__(self, folder="archive", segment_bytes=64 * 1024 * 1024,
+                 max_segments=200, block_records=1000, flush_interval=2.0, level=6):
+        self.folder = folder
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.level = level
+
+        os.makedirs(folder, exist_ok=True)
+        self.q = queue.SimpleQueue()
+        self.dat = None
+        self.idx = None
+        self._closed = False
+
+        self.thread = threading.Thread(target=self._worker, name="log-archive", daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------
+    def append(self, r):
+        # chụp field ngay: stage sau (classify) có thể sửa record
+        self.q.put((r.log_time.timestamp(), r.ts, r.uid, r.window, r.msg))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.q.put(None)
+        self.thread.join(timeout=10)
+
+    # -------------------------------------------------
+    def _worker(self):
+        block = []
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                item = self.q.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                self._safe_write(block)
+                self._close_segment()
+                return
+
+            if item:
+                block.append(item)
+
+            if len(block) >= self.block_records or (block and time.time() >= deadline):
+                self._safe_write(block)
+                block = []
+
+            if time.time() >= deadline:
+                deadline = time.time() + self.flush_interval
+
+    def _safe_write(self, block):
+        if not block:
+            return
+        try:
+            self._write_block(block)
+        except Exception as e:
+            sys.stderr.write(f"log archive error: {e}\n")
+
+    def _write_block(self, block):
+        uids = set()
+        windows = set()
+        lines = []
+        for t, ts, uid, window, msg in block:
+            line_uids = {str(uid)} if uid is not None else set()
+            line_uids.update(UID_RE.findall(msg))
+            uids.update(line_uids)
+            if window is not None:
+                windows.add(str(window))
+            lines.append(json.dumps(
+                {"t": t, "ts": ts, "uid": uid, "window": window, "msg": msg},
+                ensure_ascii=False,
+            ))
+
+        data = zlib.compress("\n".join(lines).encode("utf-8"), self.level)
+
+        if self.dat is None or self.dat.tell() + len(data) > self.segment_bytes:
+            self._open_segment()
+
+        off = self.dat.tell()
+        self.dat.write(data)
+        self.dat.flush()
+
+        self.idx.write(json.dumps({
+            "off": off,
+            "len": len(data),
+            "n": len(block),
+            "t0": min(b[0] for b in block),
+            "t1": max(b[0] for b in block),
+            "uids": sorted(uids),
+            "windows": sorted(windows),
+        }) + "\n")
+        self.idx.flush()
+
+    def _open_segment(self):
+        self._close_segment()
+        base = os.path.join(self.folder, f"seg-{time.time():.3f}")
+        self.dat = open(base + ".dat", "ab")
+        self.idx = open(base + ".idx", "a")
+        self._prune()
+
+    def _close_segment(self):
+        for f in (self.dat, self.idx):
+            if f:
+                try:
+                    f.close()
+                except:
+                    pass
+        self.dat = None
+        self.idx = None
+
+    def _prune(self):
+        segs = list_segments(self.folder)
+        for base in segs[:-self.max_segments] if self.max_segments else []:
+            for ext in (".dat", ".idx"):
+                try:
+                    os.remove(base + ext)
+                except:
+                    pass
+
+
+# =====================================================
+# QUERY
+# =====================================================
+def list_segments(folder):
+    try:
+        names = os.listdir(folder)
+    except:
+        return []
+    bases = [os.path.join(folder, n[:-4]) for n in names if n.startswith("seg-") and n.endswith(".idx")]
+    return sorted(bases, key=lambda b: float(os.path.basename(b)[4:]))
+
+
+def query(folder, uid=None, window=None, since=None, until=None):
+    """Yield dict các dòng khớp; since/until là epoch."""
+    uid = str(uid) if uid is not None else None
+    window = str(window) if window is not None else None
+
+    for base in list_segments(folder):
+        blocks = []
+        try:
+            with open(base + ".idx", "r") as f:
+                for ln in f:
+                    try:
+                        blocks.append(json.loads(ln))
+                    except:
+                        continue     # dòng cuối có thể ghi dở
+        except:
+            continue
+
+        wanted = [
+            b for b in blocks
+            if (uid is None or uid in b["uids"])
+            and (window is None or window in b["windows"])
+            and (since is None or b["t1"] >= since)
+            and (until is None or b["t0"] <= until)
+        ]
+        if not wanted:
+            continue
+
+        with open(base + ".dat", "rb") as f:
+            for b in wanted:
+                f.seek(b["off"])
+                try:
+                    text = zlib.decompress(f.read(b["len"])).decode("utf-8")
+                except:
+                    continue
+                for ln in text.split("\n"):
+                    rec = json.loads(ln)
+                    if uid is not None and str(rec["uid"]) != uid and uid not in UID_RE.findall(rec["msg"]):
+                        continue
+                    if window is not None and str(rec["window"]) != window:
+                        continue
+                    if since is not None and rec["t"] < since:
+                        continue
+                    if until is not None and rec["t"] > until:
+                        continue
+                    yield rec
+
+
+def _parse_time(s):
+    if s is None:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return datetime.datetime.fromisoformat(s).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("query")
+    q.add_argument("--dir", default="archive/crawler")
+    q.add_argument("--uid")
+    q.add_argument("--window")
+    q.add_argument("--since", help="epoch hoặc 'YYYY-MM-DD HH:MM:SS'")
+    q.add_argument("--until", help="epoch hoặc 'YYYY-MM-DD HH:MM:SS'")
+    q.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    n = 0
+    for rec in query(args.dir, args.uid, args.window, _parse_time(args.since), _parse_time(args.until)):
+        n += 1
+        if args.json:
+            print(json.dumps(rec, ensure_ascii=False))
+        else:
+            print(f"{rec['ts']}  [{rec['window']}] [UID {rec['uid']}]  {rec['msg']}")
+    sys.stderr.write(f"{n} lines in {time.perf_counter() - t:.3f}s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# log_sink.py
+import os
+import sys
+import json
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import threading
+
+
+# =====================================================
+# LOG SINK
+# =====================================================
+class LogSink:
+    """
+    Ghi log dạng JSONL từ một background thread:
+    - gom batch → một lần write/flush cho cả batch thay vì mỗi dòng
+    - dòng lặp lại trong `repeat_window` giây chỉ được đếm, lần ghi kế tiếp
+      mang trường "repeat" = số lần đã bỏ qua (không mất thông tin)
+    - file vượt `max_bytes` → rotate + gzip, giữ tối đa `backups` file cũ
+    mode: "jsonl" (file), "console" (stdout dễ đọc) hoặc "both".
+    """
+
+    def __init__(self, path="logs/crawler.jsonl", mode="jsonl",
+                 max_bytes=20 * 1024 * 1024, backups=10,
+                 flush_interval=0.5, batch_size=1000, repeat_window=300):
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.repeat_window = repeat_window
+
+        self.q = queue.SimpleQueue()
+        self.repeats = {}           # key → [last_written, suppressed]
+        self.last_purge = time.time()
+        self.f = None
+
+        if mode in ("jsonl", "both"):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.f = open(path, "a", encoding="utf-8")
+
+        self._closed = False
+        self.thread = threading.Thread(target=self._worker, name="log-sink", daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------
+    def log(self, msg, uid=None, window=None, category=None):
+        # hot path: chỉ một put vào queue
+        self.q.put((time.time(), uid, window, category, str(msg)))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.q.put(None)
+        self.thread.join(timeout=5)
+        if self.f:
+            self.f.close()
+
+    # -------------------------------------------------
+    def _worker(self):
+        while True:
+            batch = []
+            stop = False
+            try:
+                item = self.q.get(timeout=self.flush_interval)
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size:
+                    item = self.q.get_nowait()
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch or stop:
+                try:
+                    self._write(batch, final=stop)
+                except Exception as e:
+                    sys.stderr.write(f"log sink error: {e}\n")
+
+            if stop:
+                return
+
+    def _sample(self, batch, final=False):
+        out = []
+        for ts, uid, window, category, msg in batch:
+            key = (category, uid, window, msg)
+            rec = self.repeats.get(key)
+
+            if rec is not None and ts - rec[0] < self.repeat_window:
+                rec[1] += 1
+                continue
+
+            repeat = rec[1] if rec is not None else 0
+            self.repeats[key] = [ts, 0]
+            out.append((ts, uid, window, category, msg, repeat, False))
+
+        # key hết hạn: ghi một dòng tổng kết nếu còn lần lặp chưa ghi,
+        # rồi bỏ key để dict không phình mãi
+        now = time.time()
+        if final or now - self.last_purge > self.repeat_window:
+            self.last_purge = now
+            for key, (ts, suppressed) in list(self.repeats.items()):
+                if final or now - ts > self.repeat_window:
+                    del self.repeats[key]
+                    if suppressed:
+                        out.append((now,) + key[1:3] + (key[0], key[3], suppressed, True))
+
+        return out
+
+    def _write(self, batch, final=False):
+        records = self._sample(batch, final)
+        if not records:
+            return
+
+        if self.f:
+            lines = []
+            for ts, uid, window, category, msg, repeat, summary in records:
+                rec = {
+                    "ts": round(ts, 3),
+                    "uid": uid,
+                    "window": window,
+                    "category": category,
+                    "msg": msg,
+                }
+                # repeat = số lần giống hệt đã bị bỏ qua trước bản ghi này;
+                # summary = bản ghi chỉ mang số đếm, không phải một lần xuất hiện
+                if repeat:
+                    rec["repeat"] = repeat
+                if summary:
+                    rec["summary"] = True
+                lines.append(json.dumps(rec, ensure_ascii=False))
+            self.f.write("\n".join(lines) + "\n")
+            self.f.flush()
+            if self.f.tell() >= self.max_bytes:
+                self._rotate()
+
+        if self.mode in ("console", "both"):
+            sys.stdout.write("\n".join(format_console(*r[:6]) for r in records) + "\n")
+            sys.stdout.flush()
+
+    def _rotate(self):
+        self.f.close()
+        now = time.time()
+        rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+        base = os.path.basename(self.path) + "."
+        folder = os.path.dirname(self.path) or "."
+        old = sorted(p for p in os.listdir(folder) if p.startswith(base) and p.endswith(".gz"))
+        for p in old[:-self.backups] if self.backups else old:
+            try:
+                os.remove(os.path.join(folder, p))
+            except:
+                pass
+
+        self.f = open(self.path, "a", encoding="utf-8")
+
+
+def format_console(ts, uid, window, category, msg, repeat=0):
+    head = time.strftime("%H:%M:%S", time.localtime(ts))
+    if window is not None:
+        head += f" [{window}]"
+    if uid is not None:
+        head += f" [UID {uid}]"
+    tail = f" (+{repeat} repeats)" if repeat else ""
+    return f"{head} {msg}{tail}"
+
+
+# =====================================================
+# PROCESS-WIDE SINK (lazy, fork-safe)
+# =====================================================
+_config = {}
+_sink = None
+_sink_pid = None
+_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Lưu cấu hình; sink thật được tạo ở process gọi log() đầu tiên."""
+    _config.clear()
+    _config.update(kwargs)
+
+
+def get_sink():
+    global _sink, _sink_pid
+    # sau fork (supervisor child) thread của sink cha không còn → tạo mới
+    if _sink is None or _sink_pid != os.getpid():
+        with _lock:
+            if _sink is None or _sink_pid != os.getpid():
+                _sink = LogSink(**_config)
+                _sink_pid = os.getpid()
+                atexit.register(_sink.close)
+    return _sink
+
+
+def log(msg, uid=None, window=None, category=None):
+    get_sink().log(msg, uid=uid, window=window, category=category)
+
+
+def close():
+    """Flush + đóng sink của process hiện tại (nếu đã tạo)."""
+    if _sink is not None and _sink_pid == os.getpid():
+        _sink.close()
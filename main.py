@@ -1,40 +1,10 @@
 import argparse
-import threading
-import time
-import subprocess
-from crawler import run_crawler     # <<=== Dùng file crawler mới của bạn
-
-
-# =====================================================
-# FIXED UID LIST (chuẩn theo yêu cầu)
-# =====================================================
-FIXED_UIDS = [
-    10, 44, 51, 204, 178, 95,
-    145, 60, 228, 243, 231,
-    70, 186, 193, 89, 6, 189,
-    164, 217, 180, 197, 108, 162,
-    170, 29, 219, 49, 235, 215, 131, 15,
-    25, 50
-]
-
-
-# =====================================================
-# CLEAN OLD CHROME
-# =====================================================
-def clean_chrome_processes():
-    patterns = [
-        "chrome --headless",
-        "chromedriver",
-        "google-chrome",
-        "chromium"
-    ]
-    for p in patterns:
-        try:
-            subprocess.call(["pkill", "-f", p])
-        except:
-            pass
-
-clean_chrome_processes()
+import signal
+from crawler import run_crawler, FIXED_UIDS     # <<=== Dùng file crawler mới của bạn
+from supervisor import Supervisor, stopping
+from chrome_driver import clean_chrome_processes
+import log_sink
+from profiler import Profiled
 
 
 # =====================================================
@@ -42,21 +12,22 @@ clean_chrome_processes()
 # =====================================================
 is_running = False
 is_paused  = False
-active_thread = None
 
 
 # =====================================================
 # LOG TO CONSOLE
 # =====================================================
-def log_cli(msg):
-    print(msg, flush=True)
+def log_cli(msg, uid=None, window=None, category=None):
+    # buffered JSONL sink (background thread) thay cho print(flush=True) mỗi dòng
+    log_sink.log(msg, uid=uid, window=window, category=category)
 
 
 # =====================================================
 # FLAGS FOR CRAWLER
 # =====================================================
 def should_run():
-    return is_running
+    # stopping(): process con đã nhận SIGTERM từ supervisor
+    return is_running and not stopping()
 
 
 def paused_flag():
@@ -66,40 +37,43 @@ def paused_flag():
 # =====================================================
 # START FUNCTION (PM2 sẽ chạy hàm này)
 # =====================================================
-def start(minutes):
-    global is_running, is_paused, active_thread
+def start(minutes, heartbeat_timeout=60, max_rss_mb=1500, parse_workers=1,
+          archive_dir="archive/crawler", profile_dir=None, control_port=8765,
+          narrow=True, no_rows_timeout=900):
+    global is_running, is_paused
 
-    if is_running:
-        print("Restarting...")
-        is_running = False
-        time.sleep(1)
+    print(f">>> START with fixed UIDs = {FIXED_UIDS}", flush=True)
 
-    print(f">>> START with fixed UIDs = {FIXED_UIDS}")
+    # dọn Chrome cũ khi start, không còn chạy lúc import
+    clean_chrome_processes()
 
     is_running = True
     is_paused  = False
 
-    # Thread chạy crawler
-    active_thread = threading.Thread(
-        target=run_crawler,
-        args=(minutes, log_cli, should_run, paused_flag),
-        daemon=True
+    target = run_crawler
+    if profile_dir:
+        target = Profiled(run_crawler, profile_dir, log=log_cli)
+
+    # Crawler chạy trong process con → treo WebDriver / leak RAM
+    # đều bị supervisor phát hiện và kill cả cây Chrome
+    sup = Supervisor(
+        "crawler",
+        target=target,
+        args=(minutes, log_cli, should_run, paused_flag, parse_workers, archive_dir, control_port, narrow),
+        heartbeat_timeout=heartbeat_timeout,
+        no_rows_timeout=no_rows_timeout,
+        max_rss_mb=max_rss_mb,
+        # process cha không dùng log_sink (không có thread trước khi fork);
+        # stdout qua PM2 là pipe → flush để restart được thấy ngay
+        log=lambda m: print(m, flush=True),
     )
-    active_thread.start()
+    signal.signal(signal.SIGTERM, sup.stop)
 
-    # AUTO-RESTART nếu crawler crash
-    while True:
-        if not active_thread.is_alive():
-            print(">>> Thread crashed! Restarting crawler in 3 seconds...")
-            time.sleep(3)
-            active_thread = threading.Thread(
-                target=run_crawler,
-                args=(minutes, log_cli, should_run, paused_flag),
-                daemon=True
-            )
-            active_thread.start()
-
-        time.sleep(1)
+    try:
+        sup.run()
+    except KeyboardInterrupt:
+        pass
+    is_running = False
 
 
 # =====================================================
@@ -108,9 +82,30 @@ def start(minutes):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--minutes", type=int, default=5)
+    parser.add_argument("--heartbeat-timeout", type=int, default=60)
+    # trang vẫn sống nhưng không scrape được dòng nào quá N giây → restart (0 = tắt)
+    parser.add_argument("--no-rows-timeout", type=int, default=900)
+    parser.add_argument("--max-rss-mb", type=int, default=1500)
+    # >1: parse cycle lớn trên process pool (0 = số CPU)
+    parser.add_argument("--parse-workers", type=int, default=1)
+    # "" = tắt archive
+    parser.add_argument("--archive-dir", default="archive/crawler")
+    # CPU sampling + cửa sổ tracemalloc định kỳ, đủ nhẹ để bật production
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-dir", default="profiles/crawler")
+    # pause/resume, đổi UID, reload trang lúc đang chạy (0 = tắt)
+    parser.add_argument("--control-port", type=int, default=8765)
+    # không thêm from= / var-Search vào URL dashboard (nếu panel không lọc bằng regex)
+    parser.add_argument("--no-narrow", action="store_true")
+    parser.add_argument("--log-mode", choices=["jsonl", "console", "both"], default="jsonl")
+    parser.add_argument("--log-file", default="logs/crawler.jsonl")
     args = parser.parse_args()
 
-    start(args.minutes)
+    log_sink.configure(path=args.log_file, mode=args.log_mode)
+
+    start(args.minutes, args.heartbeat_timeout, args.max_rss_mb, args.parse_workers,
+          args.archive_dir, args.profile_dir if args.profile else None, args.control_port,
+          not args.no_narrow, args.no_rows_timeout)
 
 
 if __name__ == "__main__":
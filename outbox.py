@@ -0,0 +1,283 @@
+# outbox.py
+# Outbox bền trên đĩa cho alert: ghi trước, gửi sau, at-least-once qua crash.
+#   {"op": "add",  "id", "key", "channel", "content", "t"}
+#   {"op": "done", "id", "key"}
+# - add() chỉ buffer; commit() ghi cả batch + fsync một lần (group commit)
+#   rồi mới giao cho thread gửi → alert đã được chấp nhận thì không mất.
+# - Chỉ ghi "done" khi webhook trả 2xx; lỗi → thử lại theo backoff, giữ thứ tự.
+#   Bị từ chối hẳn (PermanentError: 400, 413) hoặc quá `max_attempts` lần →
+#   chuyển sang <path>.dead.jsonl + ghi "done" để hàng đợi không bị chặn.
+#   429 → chờ đúng RetryAfter.seconds, không tính vào số lần thử.
+# - Nội dung dài hơn `max_len` (Discord: 2000 ký tự) được chia thành nhiều entry.
+# - Khởi động: entry "add" chưa có "done" được gửi lại, file được compact.
+# - id = digest dedup của alert (key) → không ghi/gửi trùng; key trong outbox
+#   được gộp vào sent_history khi load (crash giữa commit và save history).
+import os
+import json
+import time
+import threading
+from collections import deque
+
+
+class PermanentError(Exception):
+    """Sender: webhook từ chối nội dung, gửi lại cũng vô ích."""
+
+
+class RetryAfter(Exception):
+    """Sender: bị rate limit, thử lại sau `seconds` giây."""
+
+    def __init__(self, seconds):
+        super().__init__(f"retry after {seconds:.1f}s")
+        self.seconds = seconds
+
+
+def split_content(content, limit=2000):
+    """Chia theo dòng thành các phần <= limit; khối ``` được đóng/mở lại ở mỗi phần."""
+    if len(content) <= limit:
+        return [content]
+
+    stripped = content.strip()
+    fenced = stripped.startswith("```") and stripped.endswith("```") and len(stripped) >= 6
+    if fenced:
+        body = stripped[3:-3].strip("\n")
+        room = limit - len("```\n\n```")
+    else:
+        body = content
+        room = limit
+
+    parts = []
+    cur = None
+    for ln in body.split("\n"):
+        # dòng dài hơn cả một phần → cắt cứng
+        while len(ln) > room:
+            if cur is not None:
+                parts.append(cur)
+                cur = None
+            parts.append(ln[:room])
+            ln = ln[room:]
+        if cur is not None and len(cur) + 1 + len(ln) > room:
+            parts.append(cur)
+            cur = None
+        cur = ln if cur is None else f"{cur}\n{ln}"
+    if cur is not None:
+        parts.append(cur)
+
+    return [f"```\n{p}\n```" for p in parts] if fenced else parts
+
+
+class Outbox:
+    def __init__(self, path, senders, log=print, retry_base=2.0, retry_max=300.0,
+                 max_attempts=20, max_len=2000, keep_done=1000, compact_bytes=1024 * 1024):
+        self.path = path
+        self.dead_path = os.path.splitext(path)[0] + ".dead.jsonl"
+        self.senders = senders
+        self.log = log
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.max_len = max_len
+        self.keep_done = keep_done
+        self.compact_bytes = compact_bytes
+
+        self.cond = threading.Condition()
+        self.queue = deque()            # entry đã fsync, chờ gửi
+        self.pending_ids = set()
+        self.done = deque(maxlen=keep_done)     # (id, key) gửi xong gần nhất
+        self.done_ids = set()
+        self.buffer = []                # entry chưa commit
+        self._closed = False
+        self.sent = 0
+        self.failures = 0
+        self.dead = 0
+
+        self._replay()
+        self.f = open(self.path, "a", encoding="utf-8")
+
+        self.thread = threading.Thread(target=self._worker, name="outbox", daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------
+    # LOAD / COMPACT
+    # -------------------------------------------------
+    def _replay(self):
+        pending = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for ln in f:
+                    try:
+                        rec = json.loads(ln)
+                    except:
+                        continue        # dòng cuối có thể ghi dở khi crash
+                    if rec.get("op") == "add":
+                        pending.setdefault(rec["id"], rec)
+                    elif rec.get("op") == "done":
+                        pending.pop(rec["id"], None)
+                        self._remember_done(rec["id"], rec.get("key"))
+        except FileNotFoundError:
+            pass
+
+        for rec in pending.values():
+            self.queue.append(rec)
+            self.pending_ids.add(rec["id"])
+        if pending:
+            self.log(f">>> [outbox] replaying {len(pending)} pending alert(s)")
+        self._compact()
+
+    def _remember_done(self, id_, key):
+        if len(self.done) == self.done.maxlen:
+            self.done_ids.discard(self.done[0][0])
+        self.done.append((id_, key))
+        self.done_ids.add(id_)
+
+    def _compact(self):
+        """Ghi lại file chỉ còn entry chờ gửi + `keep_done` done gần nhất."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for id_, key in self.done:
+                f.write(json.dumps({"op": "done", "id": id_, "key": key}) + "\n")
+            for rec in self.queue:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def keys(self):
+        """Digest dedup của mọi alert outbox đã nhận (chờ gửi + đã gửi gần đây)."""
+        with self.cond:
+            out = [rec["key"] for rec in self.queue] + [key for _, key in self.done]
+        return [int(k, 16) for k in out if k]
+
+    def __len__(self):
+        return len(self.queue)
+
+    # -------------------------------------------------
+    # PRODUCER (thread crawler)
+    # -------------------------------------------------
+    def add(self, key, channel, content):
+        """False nếu alert cùng key đã nằm trong outbox."""
+        id_ = f"{key:016x}" if key is not None else os.urandom(8).hex()
+        with self.cond:
+            if id_ in self.pending_ids or id_ in self.done_ids:
+                return False
+            parts = split_content(content, self.max_len) if self.max_len else [content]
+            # phần 2.. có id riêng nhưng chung key dedup
+            ids = [id_] + [f"{id_}.{i}" for i in range(1, len(parts))]
+            self.pending_ids.update(ids)
+        now = time.time()
+        for pid, part in zip(ids, parts):
+            self.buffer.append({
+                "op": "add",
+                "id": pid,
+                "key": f"{key:016x}" if key is not None else None,
+                "channel": channel,
+                "content": part,
+                "t": now,
+            })
+        return True
+
+    def commit(self):
+        """Một write + fsync cho cả batch, sau đó mới cho thread gửi."""
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        with self.cond:
+            self.f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.queue.extend(batch)
+            self.cond.notify()
+
+    def close(self, timeout=5.0):
+        """Dừng thread gửi; entry chưa gửi được giữ lại cho lần chạy sau."""
+        self.commit()
+        with self.cond:
+            if self._closed:
+                return
+            self._closed = True
+            self.cond.notify()
+        self.thread.join(timeout=timeout)
+        with self.cond:
+            try:
+                self.f.flush()
+                os.fsync(self.f.fileno())
+                self.f.close()
+            except:
+                pass
+
+    # -------------------------------------------------
+    # DELIVERY (thread outbox)
+    # -------------------------------------------------
+    def _worker(self):
+        delay = self.retry_base
+        attempts = 0
+        while True:
+            with self.cond:
+                while not self.queue and not self._closed:
+                    self.cond.wait()
+                if self._closed:
+                    return
+                rec = self.queue[0]
+
+            wait = None
+            dead = None
+            limited = False
+            send = self.senders.get(rec["channel"])
+            if send is None:
+                dead = f"no sender for channel {rec['channel']!r}"
+            else:
+                attempts += 1
+                try:
+                    if not send(rec["content"]):
+                        wait = delay
+                except RetryAfter as e:
+                    attempts -= 1       # rate limit không phải lỗi của entry
+                    limited = True
+                    wait = max(e.seconds, 0.1)
+                except PermanentError as e:
+                    dead = str(e)
+                except Exception as e:
+                    self.log(f">>> [outbox] send error: {e}")
+                    wait = delay
+
+                if wait is not None and attempts >= self.max_attempts:
+                    dead = f"gave up after {attempts} attempts"
+                    wait = None
+
+            with self.cond:
+                if wait is not None:
+                    # giữ thứ tự: thử lại chính entry này sau backoff (close() đánh thức)
+                    self.failures += 1
+                    self.log(f">>> [outbox] delivery failed, retry in {wait:.1f}s ({len(self.queue)} pending)")
+                    # commit() cũng notify → chờ đủ hạn, chỉ close() cắt ngang
+                    deadline = time.time() + wait
+                    while not self._closed and time.time() < deadline:
+                        self.cond.wait(deadline - time.time())
+                    if not limited:
+                        delay = min(delay * 2, self.retry_max)
+                    continue
+
+                delay = self.retry_base
+                attempts = 0
+                self.queue.popleft()
+                self.pending_ids.discard(rec["id"])
+                self._remember_done(rec["id"], rec["key"])
+                try:
+                    if dead is not None:
+                        self.dead += 1
+                        self.log(f">>> [outbox] dead-lettered {rec['id']} ({rec['channel']}): {dead}")
+                        with open(self.dead_path, "a", encoding="utf-8") as f:
+                            f.write(json.dumps(dict(rec, op="dead", reason=dead, dead_t=time.time()),
+                                               ensure_ascii=False) + "\n")
+                    else:
+                        self.sent += 1
+                    # không fsync: mất dòng done chỉ dẫn tới gửi lại (at-least-once)
+                    self.f.write(json.dumps({"op": "done", "id": rec["id"], "key": rec["key"]}) + "\n")
+                    self.f.flush()
+                    if not self.queue and self.f.tell() > self.compact_bytes:
+                        self.f.close()
+                        self._compact()
+                        self.f = open(self.path, "a", encoding="utf-8")
+                except Exception as e:
+                    self.log(f">>> [outbox] write error: {e}")
+                    if self.f.closed:
+                        self.f = open(self.path, "a", encoding="utf-8")
@@ -0,0 +1,304 @@
+# pipeline.py
+import time
+import datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from row_parser import LogRecord, RowParser, get_rows_html, ROWS_XPATH  # noqa: F401 (re-export)
+
+# Pipeline = source → chuỗi stage → (sink cũng là một stage).
+# Mỗi stage là generator: nhận iterator các batch (list), yield batch mới.
+# Kéo theo kiểu pull → source chỉ đọc cycle kế tiếp khi sink đã xử lý xong
+# cycle trước (backpressure tự nhiên); mỗi cycle là một batch, batch rỗng
+# vẫn chảy qua để stage có trạng thái (aggregate theo thời gian) được "tick".
+
+
+_idle = [0.0]
+
+
+def idle(seconds):
+    """time.sleep nhưng không tính vào thời gian của stage."""
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    _idle[0] += time.perf_counter() - t0
+
+
+# =====================================================
+# RECORDS
+# =====================================================
+class Alert:
+    __slots__ = ("key", "channel", "content", "record", "on_commit")
+
+    def __init__(self, key, channel, content, record=None, on_commit=None):
+        self.key = key              # digest để dedup, None = không dedup
+        self.channel = channel      # tên sender trong alert_sink
+        self.content = content
+        self.record = record
+        self.on_commit = on_commit  # gọi sau khi alert đã fsync vào outbox
+
+    def __repr__(self):
+        return f"Alert({self.channel!r}, {self.content[:60]!r})"
+
+
+# =====================================================
+# PIPELINE
+# =====================================================
+class StageStats:
+    __slots__ = ("name", "batches", "records", "seconds")
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.records = 0
+        self.seconds = 0.0
+
+
+class Pipeline:
+    """
+    stages: list (name, stage). Thời gian đo cho mỗi stage là thời gian
+    riêng của nó (đã trừ thời gian chờ stage phía trước), nên từng stage
+    có thể profile / thay thế / benchmark độc lập.
+    """
+
+    def __init__(self, source, stages, log=None, report_every=600):
+        self.source = source
+        self.stages = stages
+        self.log = log
+        self.report_every = report_every
+        self.stats = [StageStats("source")] + [StageStats(n) for n, _ in stages]
+
+    def __iter__(self):
+        upstream = self._measure(iter(self.source), self.stats[0], None)
+        for (name, stage), st in zip(self.stages, self.stats[1:]):
+            upstream = self._measure(None, st, (stage, upstream))
+        return upstream
+
+    def _measure(self, it, st, wrap):
+        # pulled = [thời gian chờ upstream, phần idle nằm trong đó]
+        pulled = [0.0, 0.0]
+
+        if wrap is not None:
+            stage, upstream = wrap
+
+            def feed():
+                while True:
+                    t0 = time.perf_counter()
+                    i0 = _idle[0]
+                    try:
+                        batch = next(upstream)
+                    except StopIteration:
+                        return
+                    finally:
+                        pulled[0] += time.perf_counter() - t0
+                        pulled[1] += _idle[0] - i0
+                    yield batch
+
+            it = iter(stage(feed()))
+
+        while True:
+            p0, pi0 = pulled
+            i0 = _idle[0]
+            t0 = time.perf_counter()
+            try:
+                batch = next(it)
+            except StopIteration:
+                return
+            finally:
+                waited = pulled[0] - p0
+                own_idle = (_idle[0] - i0) - (pulled[1] - pi0)
+                st.seconds += time.perf_counter() - t0 - waited - own_idle
+            st.batches += 1
+            st.records += len(batch)
+            yield batch
+
+    def run(self):
+        last_report = time.time()
+        for _ in self:
+            if self.log and self.report_every and time.time() - last_report >= self.report_every:
+                last_report = time.time()
+                self.log(self.report())
+
+    def report(self):
+        lines = [">>> Pipeline stages (exclusive time):"]
+        for st in self.stats:
+            per = st.seconds / st.batches * 1000 if st.batches else 0.0
+            lines.append(
+                f"    {st.name:<12} {st.seconds:9.2f}s  {st.batches:7} batches  "
+                f"{st.records:9} records  {per:8.2f} ms/batch"
+            )
+        return "\n".join(lines)
+
+
+def stage(fn):
+    """Biến hàm batch → batch thành generator stage."""
+    def run(batches):
+        for batch in batches:
+            yield fn(batch)
+    return run
+
+
+# =====================================================
+# GRAFANA
+# =====================================================
+def dashboard_url(base, minutes=None, search=None):
+    """
+    base + time range (from=now-{minutes}m) + biến Search, để Grafana / Chrome
+    chỉ render những dòng crawler thực sự dùng.
+    """
+    parts = urlsplit(base)
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in ("from", "to", "var-Search")
+    ]
+    if minutes:
+        query += [("from", f"now-{minutes}m"), ("to", "now")]
+    if search:
+        query.append(("var-Search", search))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def wait_for_rows(driver, xpath=ROWS_XPATH, timeout=12):
+    """True khi trang đã có ít nhất một dòng log."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, xpath)))
+        return True
+    except Exception:
+        return False
+
+
+# =====================================================
+# SHARED STAGES
+# =====================================================
+def grafana_source(driver, should_run, paused_flag, beat=None,
+                   xpath=ROWS_XPATH, interval=5.0, idle_interval=1.0,
+                   pause_interval=0.5, before_cycle=None):
+    """
+    Mỗi cycle: scroll, lấy innerHTML mọi dòng → một batch chuỗi HTML.
+    before_cycle() chạy đầu mỗi cycle (áp dụng lệnh control: đổi UID, reload).
+    beat() chỉ được gọi sau khi scrape thành công → session Chrome chết thì
+    heartbeat ngừng và supervisor restart.
+    """
+    beat = beat or (lambda rows=0, scraped=0, paused=False: None)
+
+    while should_run():
+        if paused_flag():
+            # đang pause là trạng thái hợp lệ, không tính là "không có dòng"
+            beat(paused=True)
+            idle(pause_interval)
+            continue
+
+        if before_cycle:
+            before_cycle()
+
+        try:
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        except:
+            pass
+
+        rows = get_rows_html(driver, xpath)
+        if rows is None:
+            # WebDriver lỗi → không beat, không yield; thử lại cycle sau
+            idle(idle_interval)
+            continue
+
+        # trang hiển thị lại cả dòng cũ mỗi cycle → số dòng đã xử lý được
+        # đếm sau dedup (on_new của crawler), ở đây chỉ báo số dòng scrape được
+        beat(scraped=len(rows))
+        yield rows
+
+        # generator chỉ chạy tiếp khi downstream xử lý xong batch
+        idle(interval if rows else idle_interval)
+
+
+def extract(parser):
+    """HTML → LogRecord (RowParser tự quyết parse tuần tự hay song song)."""
+    def run(batches):
+        try:
+            for rows in batches:
+                yield parser.parse(rows) if rows else []
+        finally:
+            parser.close()
+    return run
+
+
+def time_filter(minutes):
+    """Bỏ dòng cũ hơn `minutes`, sắp xếp theo thời gian log."""
+    time_range = datetime.timedelta(minutes=minutes)
+
+    def fn(batch):
+        now = datetime.datetime.now()
+        out = [r for r in batch if now - r.log_time <= time_range]
+        out.sort(key=lambda r: r.log_time)
+        return out
+    return stage(fn)
+
+
+def dedup(seen, minutes, on_new=None, key=None):
+    """
+    Chỉ cho qua dòng chưa thấy trong `minutes` phút gần nhất
+    (seen: FingerprintSet digest → thời điểm thấy lần đầu).
+    key(r) → digest dùng để dedup, mặc định r.fp (ts + msg).
+    """
+    horizon = minutes * 60
+
+    def fn(batch):
+        now = time.time()
+        out = []
+        for r in batch:
+            k = key(r) if key else r.fp
+            if k in seen:
+                continue
+            seen.add(k, now)
+            out.append(r)
+            if on_new:
+                on_new(r)
+        seen.expire(now - horizon)
+        return out
+    return stage(fn)
+
+
+def archive(arch):
+    """Ghi mọi record qua stage vào LogArchive (non-blocking), batch đi tiếp nguyên vẹn."""
+    def run(batches):
+        try:
+            for batch in batches:
+                for r in batch:
+                    arch.append(r)
+                yield batch
+        finally:
+            arch.close()
+    return run
+
+
+def alert_sink(outbox, history, save_history, log=print):
+    """
+    Đưa Alert vào outbox (gửi ở thread riêng, retry tới khi 2xx); alert có key
+    chỉ nhận một lần (history: FingerprintSet). Mỗi batch: fsync outbox một lần
+    rồi mới lưu history → history không bao giờ có alert chưa nằm trên đĩa.
+    """
+    def fn(batch):
+        changed = False
+        committed = []
+        for a in batch:
+            if a.key is not None and a.key in history:
+                continue
+            if a.channel not in outbox.senders:
+                log(f">>> No sender for channel {a.channel!r}")
+                continue
+            outbox.add(a.key, a.channel, a.content)
+            if a.key is not None:
+                history.add(a.key, time.time())
+            if a.on_commit:
+                committed.append(a.on_commit)
+            changed = True
+        if changed:
+            outbox.commit()
+            save_history(history)
+            # trạng thái dedup riêng (last_sent_window...) chỉ lưu khi alert đã trên đĩa
+            for cb in committed:
+                cb()
+        return batch
+    return stage(fn)
@@ -0,0 +1,201 @@
+# profiler.py
+# Profiling mode luôn-bật cho monitor chạy lâu (--profile):
+# - CPU: thread nền lấy mẫu stack của thread crawler (sys._current_frames),
+#   mỗi `dump_every` giây ghi cpu-<ts>.folded (định dạng flamegraph.pl / speedscope)
+# - RAM: tracemalloc làm chậm code cấp phát nhiều (BeautifulSoup) vài lần
+#   → chỉ bật theo cửa sổ: mỗi `mem_every` giây trace `mem_window` giây, snapshot
+#   cuối cửa sổ = các chỗ cấp phát còn giữ bộ nhớ (đang phình), ghi mem-<ts>.txt
+#   kèm diff với cửa sổ trước và kích thước các cấu trúc đăng ký qua gauge()
+# - Giữ tổng dung lượng thư mục <= keep_bytes, xoá file cũ nhất trước.
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+
+
+# =====================================================
+# GAUGES (no-op khi không profile: chỉ là một dict)
+# =====================================================
+_gauges = {}
+
+
+def gauge(name, fn):
+    """Đăng ký hàm trả về kích thước một cấu trúc (len(seen)...)."""
+    _gauges[name] = fn
+
+
+# =====================================================
+# PROFILER
+# =====================================================
+class Profiler:
+    def __init__(self, folder="profiles", interval=0.02, dump_every=300,
+                 mem_every=1800, mem_window=30, keep_bytes=50 * 1024 * 1024,
+                 mem_top=30, thread=None, log=None):
+        self.folder = folder
+        self.interval = interval
+        self.dump_every = dump_every
+        self.mem_every = mem_every
+        self.mem_window = mem_window
+        self.keep_bytes = keep_bytes
+        self.mem_top = mem_top
+        self.log = log
+
+        self.target = (thread or threading.current_thread()).ident
+        self.stacks = Counter()
+        self.samples = 0
+        self.prev_snapshot = None
+        self.mem_started = None
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.dump_cpu()
+        if self.mem_started is not None:
+            self.dump_mem()
+
+    # -------------------------------------------------
+    def _run(self):
+        now = time.time()
+        next_dump = now + self.dump_every
+        # cửa sổ RAM đầu tiên sau khi crawler đã vào trạng thái ổn định
+        next_mem = now + min(self.mem_every, self.dump_every)
+
+        while not self._stop.wait(self.interval):
+            self.sample()
+            now = time.time()
+            try:
+                if self.mem_started is None and now >= next_mem and not tracemalloc.is_tracing():
+                    tracemalloc.start(1)
+                    self.mem_started = now
+                elif self.mem_started is not None and now - self.mem_started >= self.mem_window:
+                    self.dump_mem()
+                    next_mem = time.time() + self.mem_every
+
+                if now >= next_dump:
+                    next_dump = now + self.dump_every
+                    self.dump_cpu()
+            except Exception as e:
+                sys.stderr.write(f"profiler dump error: {e}\n")
+
+    def sample(self):
+        frame = sys._current_frames().get(self.target)
+        if frame is None:
+            return
+        parts = []
+        while frame is not None:
+            co = frame.f_code
+            parts.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(parts))] += 1
+        self.samples += 1
+
+    # -------------------------------------------------
+    def dump_cpu(self):
+        stacks, self.stacks = self.stacks, Counter()
+        samples, self.samples = self.samples, 0
+        if stacks:
+            path = os.path.join(self.folder, f"cpu-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+            with open(path, "w") as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+
+        if self.log:
+            leaf = Counter()
+            for stack, n in stacks.items():
+                leaf[stack.rsplit(";", 1)[-1]] += n
+            top = ", ".join(f"{k} {100 * n / samples:.0f}%" for k, n in leaf.most_common(3)) if samples else "-"
+            self.log(f">>> [profile] {samples} samples, top: {top}; {' '.join(gauge_lines())}")
+
+        self._prune()
+
+    def dump_mem(self):
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        window = time.time() - self.mem_started
+        tracemalloc.stop()
+        self.mem_started = None
+
+        lines = [f"# allocations made in the last {window:.0f}s window and still alive"]
+        lines += [str(st) for st in snap.statistics("lineno")[:self.mem_top]]
+
+        lines.append("")
+        lines.append("# gauges")
+        lines += gauge_lines()
+
+        if self.prev_snapshot is not None:
+            lines.append("")
+            lines.append("# vs previous window")
+            lines += [str(st) for st in snap.compare_to(self.prev_snapshot, "lineno")[:self.mem_top]]
+        self.prev_snapshot = snap
+
+        path = os.path.join(self.folder, f"mem-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        self._prune()
+
+    def _prune(self):
+        files = []
+        for name in os.listdir(self.folder):
+            p = os.path.join(self.folder, name)
+            try:
+                files.append((os.path.getmtime(p), os.path.getsize(p), p))
+            except:
+                continue
+        files.sort()
+        total = sum(s for _, s, _ in files)
+        for _, size, p in files:
+            if total <= self.keep_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except:
+                pass
+
+
+def read_gauges():
+    out = {}
+    for name, fn in sorted(_gauges.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:
+            out[name] = f"error({e})"
+    return out
+
+
+def gauge_lines():
+    return [f"{name}={v}" for name, v in read_gauges().items()]
+
+
+# =====================================================
+# TARGET WRAPPER (cho Supervisor)
+# =====================================================
+class Profiled:
+    """Chạy target với Profiler gắn vào thread gọi nó (thread crawler trong process con)."""
+
+    def __init__(self, target, folder, log=None, **opts):
+        self.target = target
+        self.folder = folder
+        self.log = log
+        self.opts = opts
+
+    def __call__(self, *args, **kwargs):
+        prof = Profiler(self.folder, log=self.log, **self.opts)
+        prof.start()
+        try:
+            return self.target(*args, **kwargs)
+        finally:
+            prof.stop()
@@ -0,0 +1,157 @@
+# row_parser.py
+import os
+import datetime
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from fingerprint import fingerprint
+
+ROWS_XPATH = "//tr[td[contains(@class,'logs-row__localtime')]]"
+
+# Một execute_script lấy innerHTML của mọi dòng
+# thay vì một round-trip WebDriver (get_attribute) cho mỗi dòng
+ROWS_HTML_JS = """
+const r = document.evaluate(arguments[0], document, null,
+    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const out = [];
+for (let i = 0; i < r.snapshotLength; i++) out.push(r.snapshotItem(i).innerHTML);
+return out;
+"""
+
+
+def get_rows_html(driver, xpath=ROWS_XPATH):
+    """None nếu WebDriver lỗi (session Chrome chết...), khác với trang không có dòng."""
+    try:
+        return driver.execute_script(ROWS_HTML_JS, xpath) or []
+    except:
+        return None
+
+
+# =====================================================
+# RECORD
+# =====================================================
+class LogRecord:
+    """Một dòng log đã parse; __slots__ → nhẹ, pickle được qua process pool."""
+
+    __slots__ = ("ts", "log_time", "msg", "fp", "uid", "window", "category")
+
+    def __init__(self, ts, log_time, msg, fp, uid=None, window=None, category=None):
+        self.ts = ts
+        self.log_time = log_time
+        self.msg = msg
+        self.fp = fp
+        self.uid = uid
+        self.window = window
+        self.category = category
+
+    def __repr__(self):
+        return f"LogRecord({self.ts!r}, uid={self.uid!r}, window={self.window!r}, {self.msg[:60]!r})"
+
+
+# =====================================================
+# SINGLE ROW
+# =====================================================
+def parse_row(html, msg_sep="\n", msg_strip=False):
+    """LogRecord hoặc None nếu dòng hỏng."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    tds = soup.find_all("td")
+    if len(tds) < 5:
+        return None
+
+    ts = tds[2].get_text(strip=True)
+
+    try:
+        log_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f")
+    except:
+        try:
+            log_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+        except:
+            return None
+
+    # label Loki (eval_uid, current_window) nằm trong title của span
+    uid = None
+    window = None
+    for sp in tds[3].find_all("span"):
+        title = sp.get("title", "")
+        if "current_window:" in title:
+            window = title.split(":", 1)[1].strip()
+        elif "eval_uid:" in title:
+            uid = title.split(":", 1)[1].strip()
+
+    msg = tds[4].get_text(msg_sep, strip=msg_strip)
+    return LogRecord(ts, log_time, msg, fingerprint(ts, msg), uid, window)
+
+
+def parse_rows(htmls, msg_sep="\n", msg_strip=False):
+    out = []
+    for html in htmls:
+        rec = parse_row(html, msg_sep, msg_strip)
+        if rec is not None:
+            out.append(rec)
+    return out
+
+
+def _parse_chunk(args):
+    return parse_rows(*args)
+
+
+# =====================================================
+# PARALLEL PARSER
+# =====================================================
+class RowParser:
+    """
+    Parse các dòng của một cycle, chia chunk cho process pool khi đủ lớn.
+    Dưới `threshold` dòng (hoặc workers <= 1) parse ngay trong thread hiện tại
+    vì chi phí pickle/IPC lớn hơn phần tiết kiệm được.
+    Kết quả giữ đúng thứ tự đầu vào, giống hệt parse_rows().
+    """
+
+    def __init__(self, workers=1, threshold=400, chunks_per_worker=4,
+                 msg_sep="\n", msg_strip=False):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.threshold = threshold
+        self.chunks_per_worker = chunks_per_worker
+        self.msg_sep = msg_sep
+        self.msg_strip = msg_strip
+        self.pool = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            # forkserver: không fork cả process đang có thread (log sink...)
+            try:
+                ctx = mp.get_context("forkserver")
+            except ValueError:
+                ctx = mp.get_context()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self.pool
+
+    def parse(self, htmls):
+        if self.workers <= 1 or len(htmls) < self.threshold:
+            return parse_rows(htmls, self.msg_sep, self.msg_strip)
+
+        n_chunks = self.workers * self.chunks_per_worker
+        size = max(1, -(-len(htmls) // n_chunks))
+        chunks = [
+            (htmls[i:i + size], self.msg_sep, self.msg_strip)
+            for i in range(0, len(htmls), size)
+        ]
+
+        try:
+            out = []
+            for part in self._get_pool().map(_parse_chunk, chunks):
+                out.extend(part)
+            return out
+        except Exception:
+            # pool hỏng (worker bị kill...) → tạo lại lần sau, cycle này parse tuần tự
+            self.close()
+            return parse_rows(htmls, self.msg_sep, self.msg_strip)
+
+    def close(self):
+        if self.pool is not None:
+            try:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            except:
+                pass
+            self.pool = None
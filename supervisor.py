@@ -0,0 +1,307 @@
+# supervisor.py
+import os
+import json
+import time
+import signal
+import multiprocessing as mp
+from collections import deque
+
+import log_sink
+
+
+# =====================================================
+# PROCESS TREE HELPERS (Linux /proc, no psutil)
+# =====================================================
+def _children_map():
+    children = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except:
+        return children
+
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat", "r") as f:
+                stat = f.read()
+            # comm có thể chứa dấu cách → cắt sau dấu ")" cuối cùng
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except:
+            continue
+        children.setdefault(ppid, []).append(int(p))
+    return children
+
+
+def process_tree(pid):
+    """pid + mọi tiến trình con cháu (Chrome, chromedriver...)."""
+    tree = [pid]
+    children = _children_map()
+    i = 0
+    while i < len(tree):
+        tree.extend(children.get(tree[i], []))
+        i += 1
+    return tree
+
+
+def _read_kb(path, field):
+    try:
+        with open(path, "r") as f:
+            for ln in f:
+                if ln.startswith(field):
+                    return int(ln.split()[1])
+    except:
+        pass
+    return None
+
+
+def rss_mb(pid):
+    """
+    Bộ nhớ (MB) của cả cây tiến trình, 0 nếu không đọc được /proc.
+    Cộng Pss (smaps_rollup): các renderer Chrome chia sẻ nhiều trang nhớ,
+    cộng VmRSS sẽ đếm trùng. Kernel < 4.14 không có smaps_rollup → VmRSS.
+    """
+    total_kb = 0
+    for p in process_tree(pid):
+        kb = _read_kb(f"/proc/{p}/smaps_rollup", "Pss:")
+        if kb is None:
+            kb = _read_kb(f"/proc/{p}/status", "VmRSS:")
+        total_kb += kb or 0
+    return total_kb / 1024.0
+
+
+def kill_tree(pid, grace=5.0):
+    tree = process_tree(pid)
+
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except:
+            pass
+
+    deadline = time.time() + grace
+    while time.time() < deadline:
+        if not any(_alive(p) for p in tree):
+            return
+        time.sleep(0.2)
+
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except:
+        pass
+    for p in tree:
+        try:
+            os.kill(p, signal.SIGKILL)
+        except:
+            pass
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # zombie chưa được reap vẫn còn trong /proc
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except:
+        return False
+
+
+# =====================================================
+# CHILD ENTRY
+# =====================================================
+_stopping = [False]
+
+
+def stopping():
+    """True khi process con đã nhận SIGTERM → should_run() của crawler trả False."""
+    return _stopping[0]
+
+
+def _stop_on_term(*_):
+    # chỉ bật cờ: SystemExit sẽ bị các `except:` trần quanh WebDriver nuốt mất
+    _stopping[0] = True
+
+
+def _child_main(target, args, hb):
+    # Process group riêng → kill được cả Chrome con
+    try:
+        os.setsid()
+    except:
+        pass
+    # SIGTERM → vòng lặp dừng ở cycle kế tiếp, các khối finally (đóng archive,
+    # outbox, quit Chrome) được chạy; treo quá stop_grace thì supervisor SIGKILL
+    _stopping[0] = False
+    signal.signal(signal.SIGTERM, _stop_on_term)
+
+    # hb = [beat cuối, số dòng đã xử lý, lần cuối scrape được dòng / đang pause]
+    def heartbeat(rows=0, scraped=0, paused=False):
+        now = time.time()
+        hb[0] = now
+        hb[1] += rows
+        if scraped or paused:
+            hb[2] = now
+
+    heartbeat()
+    try:
+        target(*args, heartbeat=heartbeat)
+    finally:
+        # multiprocessing thoát bằng os._exit → atexit không chạy, flush log tại đây
+        log_sink.close()
+
+
+# =====================================================
+# SUPERVISOR
+# =====================================================
+class Supervisor:
+    """
+    Chạy crawler trong process con, theo dõi heartbeat (thời điểm vòng lặp
+    cuối + số dòng đã xử lý + lần cuối scrape được dòng) và RSS. Miss heartbeat
+    / quá `no_rows_timeout` không scrape được dòng nào / vượt RSS / process
+    chết → kill cả cây tiến trình rồi spawn lại với exponential backoff.
+    """
+
+    def __init__(self, name, target, args, log=print,
+                 heartbeat_timeout=60, no_rows_timeout=900, max_rss_mb=1500,
+                 backoff_base=1.0, backoff_max=60.0, stable_after=300,
+                 poll_interval=1.0, rss_interval=5.0, history_size=100,
+                 stop_grace=15.0):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.log = log
+
+        self.heartbeat_timeout = heartbeat_timeout
+        # trang vẫn load nhưng trống (Grafana logout, panel lỗi...) → 0 = tắt
+        self.no_rows_timeout = no_rows_timeout
+        self.max_rss_mb = max_rss_mb
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.poll_interval = poll_interval
+        self.rss_interval = rss_interval
+        # đủ cho một cycle (scrape + sleep 5s) kết thúc sau SIGTERM
+        self.stop_grace = stop_grace
+
+        self.history = deque(maxlen=history_size)
+        self.history_file = f"supervisor_history_{name}.json"
+
+        self.proc = None
+        self.hb = None
+        self.started_at = None
+        self.failures = 0
+        self.restarts = 0
+        self.last_rss_check = 0.0
+        self._stop = False
+
+    # -------------------------------------------------
+    def stop(self, *_):
+        self._stop = True
+
+    def spawn(self):
+        # fork tường minh: child dùng should_run / cấu hình log_sink / FIXED_UIDS
+        # của process cha; spawn / forkserver (mặc định trên macOS, Windows,
+        # Python >= 3.14) import lại module → is_running = False, crawler thoát ngay
+        ctx = mp.get_context("fork")
+        self.hb = ctx.RawArray("d", 3)
+        self.proc = ctx.Process(
+            target=_child_main,
+            args=(self.target, self.args, self.hb),
+            name=f"{self.name}-worker",
+            daemon=False,
+        )
+        self.started_at = time.time()
+        self.hb[0] = self.started_at
+        self.hb[2] = self.started_at
+        self.proc.start()
+        self.log(f">>> [supervisor] {self.name} started (pid {self.proc.pid})")
+
+    def check(self):
+        """None nếu child khoẻ, ngược lại là lý do restart."""
+        if not self.proc.is_alive():
+            return f"exited (code {self.proc.exitcode})"
+
+        silent = time.time() - self.hb[0]
+        if silent > self.heartbeat_timeout:
+            return f"missed heartbeat ({silent:.0f}s)"
+
+        empty = time.time() - self.hb[2]
+        if self.no_rows_timeout and empty > self.no_rows_timeout:
+            return f"no rows scraped for {empty / 60:.0f} min"
+
+        # quét /proc tốn hơn → không cần mỗi giây
+        if self.max_rss_mb and time.time() - self.last_rss_check >= self.rss_interval:
+            self.last_rss_check = time.time()
+            rss = rss_mb(self.proc.pid)
+            if rss > self.max_rss_mb:
+                return f"rss {rss:.0f}MB > {self.max_rss_mb}MB"
+
+        return None
+
+    def reap(self, reason):
+        kill_tree(self.proc.pid, self.stop_grace)
+        self.proc.join(timeout=5)
+
+        uptime = time.time() - self.started_at
+        if uptime >= self.stable_after:
+            self.failures = 0
+        self.failures += 1
+        self.restarts += 1
+
+        delay = min(self.backoff_base * 2 ** (self.failures - 1), self.backoff_max)
+
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "reason": reason,
+            "uptime": round(uptime, 1),
+            "rows": int(self.hb[1]),
+            "last_heartbeat_age": round(time.time() - self.hb[0], 1),
+            "backoff": delay,
+        }
+        self.history.append(entry)
+        self.save_history()
+
+        self.log(
+            f">>> [supervisor] {self.name} restart #{self.restarts}: {reason} "
+            f"after {uptime:.0f}s, rows={entry['rows']} → respawn in {delay:.1f}s"
+        )
+        return delay
+
+    def save_history(self):
+        try:
+            with open(self.history_file, "w") as f:
+                json.dump(list(self.history), f, indent=1)
+        except:
+            pass
+
+    def report(self):
+        lines = [f">>> [supervisor] {self.name} restart history ({self.restarts} total):"]
+        for e in self.history:
+            lines.append(
+                f"    {e['time']}  {e['reason']}  uptime={e['uptime']}s  rows={e['rows']}"
+            )
+        return "\n".join(lines)
+
+    # -------------------------------------------------
+    def run(self):
+        try:
+            while not self._stop:
+                self.spawn()
+
+                reason = None
+                while not self._stop and reason is None:
+                    time.sleep(self.poll_interval)
+                    reason = self.check()
+
+                if self._stop:
+                    break
+
+                delay = self.reap(reason)
+
+                deadline = time.time() + delay
+                while not self._stop and time.time() < deadline:
+                    time.sleep(0.2)
+        finally:
+            if self.proc is not None and self.proc.is_alive():
+                kill_tree(self.proc.pid, self.stop_grace)
+                self.proc.join(timeout=5)
+            if self.history:
+                self.log(self.report())
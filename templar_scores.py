@@ -1,8 +1,10 @@
 import argparse
-import threading
-import time
-import subprocess
+import signal
 from crawler_templar_scores import run_crawler_templar_scores
+from supervisor import Supervisor, stopping
+from chrome_driver import clean_chrome_processes
+import log_sink
+from profiler import Profiled
 
 # ==========================
 # FIXED UID LIST
@@ -15,83 +17,67 @@ FIXED_UIDS = [
     "170","162", "215","235","131", "15","25","50"
 ]
 
-# ==========================
-# KILL OLD CHROME INSTANCES
-# ==========================
-def clean_chrome_processes():
-    patterns = [
-        "chrome --headless",
-        "chromedriver",
-        "google-chrome",
-        "chromium"
-    ]
-    for p in patterns:
-        try:
-            subprocess.call(["pkill", "-f", p])
-        except:
-            pass
-
-clean_chrome_processes()
-
-
 # ==========================
 # FLAGS
 # ==========================
 is_running = False
 is_paused = False
 
-crawler_thread = None
-
 
 # ==========================
 # HELPERS
 # ==========================
-def log_cli(msg):
-    print(msg, flush=True)
+def log_cli(msg, uid=None, window=None, category=None):
+    # buffered JSONL sink (background thread) thay cho print(flush=True) mỗi dòng
+    log_sink.log(msg, uid=uid, window=window, category=category)
 
 def should_run():
-    return is_running
+    # stopping(): process con đã nhận SIGTERM từ supervisor
+    return is_running and not stopping()
 
 def paused_flag():
     return is_paused
 
 
 # ==========================
-# START WORKER THREAD
+# MAIN LOOP (supervised child process)
 # ==========================
-def start_worker(minutes):
-    global crawler_thread
-
-    crawler_thread = threading.Thread(
-        target=run_crawler_templar_scores,
-        args=(FIXED_UIDS, minutes, log_cli, should_run, paused_flag),
-        daemon=True
-    )
-    crawler_thread.start()
-
-
-# ==========================
-# MAIN LOOP (NO WHILE TRUE)
-# ==========================
-def start(minutes):
+def start(minutes, heartbeat_timeout=60, max_rss_mb=1500,
+          archive_dir="archive/templar_scores", profile_dir=None, control_port=8766,
+          narrow=True, no_rows_timeout=900):
     global is_running, is_paused
 
-    print(f">>> START with fixed UIDs = {FIXED_UIDS}")
+    print(f">>> START with fixed UIDs = {FIXED_UIDS}", flush=True)
+
+    # dọn Chrome cũ khi start, không còn chạy lúc import
+    clean_chrome_processes()
 
     is_running = True
     is_paused = False
 
-    start_worker(minutes)
-
-    # Instead of infinite while True, use a soft-loop so PM2 can restart process
-    while is_running:
-        # If thread dies unexpectedly → restart it
-        if not crawler_thread.is_alive():
-            print(">>> Worker crashed! Restarting worker in 3 seconds...")
-            time.sleep(3)
-            start_worker(minutes)
+    target = run_crawler_templar_scores
+    if profile_dir:
+        target = Profiled(run_crawler_templar_scores, profile_dir, log=log_cli)
+
+    # Worker chạy trong process con, supervisor restart khi treo / leak RAM
+    sup = Supervisor(
+        "templar_scores",
+        target=target,
+        args=(FIXED_UIDS, minutes, log_cli, should_run, paused_flag, archive_dir, control_port, narrow),
+        heartbeat_timeout=heartbeat_timeout,
+        no_rows_timeout=no_rows_timeout,
+        max_rss_mb=max_rss_mb,
+        # process cha không dùng log_sink (không có thread trước khi fork);
+        # stdout qua PM2 là pipe → flush để restart được thấy ngay
+        log=lambda m: print(m, flush=True),
+    )
+    signal.signal(signal.SIGTERM, sup.stop)
 
-        time.sleep(1)
+    try:
+        sup.run()
+    except KeyboardInterrupt:
+        pass
+    is_running = False
 
 
 # ==========================
@@ -100,9 +86,28 @@ def start(minutes):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--minutes", type=int, default=5)
+    parser.add_argument("--heartbeat-timeout", type=int, default=60)
+    # trang vẫn sống nhưng không scrape được dòng nào quá N giây → restart (0 = tắt)
+    parser.add_argument("--no-rows-timeout", type=int, default=900)
+    parser.add_argument("--max-rss-mb", type=int, default=1500)
+    # "" = tắt archive
+    parser.add_argument("--archive-dir", default="archive/templar_scores")
+    # CPU sampling + cửa sổ tracemalloc định kỳ, đủ nhẹ để bật production
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-dir", default="profiles/templar_scores")
+    # pause/resume, đổi UID, reload trang lúc đang chạy (0 = tắt)
+    parser.add_argument("--control-port", type=int, default=8766)
+    # không thêm from= / var-Search vào URL dashboard (nếu panel không lọc bằng regex)
+    parser.add_argument("--no-narrow", action="store_true")
+    parser.add_argument("--log-mode", choices=["jsonl", "console", "both"], default="jsonl")
+    parser.add_argument("--log-file", default="logs/templar_scores.jsonl")
     args = parser.parse_args()
 
-    start(args.minutes)
+    log_sink.configure(path=args.log_file, mode=args.log_mode)
+
+    start(args.minutes, args.heartbeat_timeout, args.max_rss_mb, args.archive_dir,
+          args.profile_dir if args.profile else None, args.control_port,
+          not args.no_narrow, args.no_rows_timeout)
 
 
 if __name__ == "__main__":
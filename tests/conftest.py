@@ -0,0 +1,6 @@
+# conftest.py
+# Module nằm phẳng ở thư mục gốc repo → cho test import trực tiếp.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
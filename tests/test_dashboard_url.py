@@ -0,0 +1,112 @@
+# test_dashboard_url.py
+import re
+from urllib.parse import urlsplit, parse_qs
+
+import crawler
+import crawler_templar_scores
+from pipeline import dashboard_url
+from control import Control
+
+BASE = "https://grafana.example/d/logs/validator?orgId=1&refresh=5s"
+
+
+def params(url):
+    return parse_qs(urlsplit(url).query, keep_blank_values=True)
+
+
+# =====================================================
+# URL
+# =====================================================
+def test_dashboard_url_adds_range_and_search():
+    q = params(dashboard_url(BASE, 5, "(?i)UID\\s+(10)\\b"))
+    assert q["orgId"] == ["1"] and q["refresh"] == ["5s"]
+    assert q["from"] == ["now-5m"] and q["to"] == ["now"]
+    assert q["var-Search"] == ["(?i)UID\\s+(10)\\b"]
+
+
+def test_dashboard_url_replaces_existing_params():
+    url = dashboard_url(BASE + "&from=now-6h&to=now&var-Search=old", 10, "new")
+    q = params(url)
+    assert q["from"] == ["now-10m"] and q["var-Search"] == ["new"]
+    assert urlsplit(url).path == "/d/logs/validator"
+
+
+def test_dashboard_url_without_narrowing():
+    q = params(dashboard_url(BASE))
+    assert "from" not in q and "var-Search" not in q
+
+
+# =====================================================
+# SEARCH REGEX
+# =====================================================
+def test_search_regex_selects_monitored_uids():
+    rx = re.compile(crawler.search_regex([44, 10]))
+    assert rx.search("Failed to upload for UID 10")
+    assert rx.search("uid  44 timed out")
+    assert not rx.search("Failed to upload for UID 100")
+    assert not rx.search("Failed to upload for UID 5")
+    # dòng global luôn được giữ dù không nhắc UID nào
+    assert rx.search("[dcp][upload] done")
+    assert rx.search("creating checkpoint at global_step 1200")
+    assert rx.search("MEGA SLASH on UID 5")
+    assert rx.search("Updated scores for evaluated UIDs")
+
+
+def test_grafana_url_uses_uid_set():
+    q = params(crawler.grafana_url(5, [10]))
+    assert q["var-Search"] == [crawler.search_regex([10])]
+
+
+def test_templar_search_regex():
+    rx = re.compile(crawler_templar_scores.SEARCH_REGEX)
+    for key in crawler_templar_scores.TEMPLAR_KEYS:
+        assert rx.search(f"UID 10: {key}: 0.5")
+    assert rx.search("Computed final score: 0.1")
+    assert not rx.search("Loading checkpoint")
+
+
+# =====================================================
+# FALLBACK
+# =====================================================
+class FakeDriver:
+    def __init__(self, rows_at):
+        self.rows_at = rows_at      # URL → trang có dòng log hay không
+        self.url = None
+        self.visited = []
+
+    def get(self, url):
+        self.url = url
+        self.visited.append(url)
+
+    def has_rows(self):
+        return self.rows_at.get(self.url, False)
+
+
+def control(tmp_path, plain_url):
+    c = Control("t", [10], log=lambda m: None, state_file=str(tmp_path / "ctl.json"))
+    c.plain_url = plain_url
+    return c
+
+
+def test_open_keeps_narrow_url_when_it_has_rows(tmp_path):
+    narrow = dashboard_url(BASE, 5, "x")
+    d = FakeDriver({narrow: True, BASE: True})
+    c = control(tmp_path, BASE)
+    c.open(d, narrow, d.has_rows)
+    assert c.narrow and c.url == narrow and d.visited == [narrow]
+
+
+def test_open_falls_back_to_plain_url(tmp_path):
+    narrow = dashboard_url(BASE, 5, "x")
+    d = FakeDriver({narrow: False, BASE: True})
+    c = control(tmp_path, BASE)
+    c.open(d, narrow, d.has_rows)
+    assert not c.narrow and c.url == BASE and d.url == BASE
+
+
+def test_open_stays_narrow_when_both_empty(tmp_path):
+    narrow = dashboard_url(BASE, 5, "x")
+    d = FakeDriver({})
+    c = control(tmp_path, BASE)
+    c.open(d, narrow, d.has_rows)
+    assert c.narrow and c.url == narrow and d.url == narrow
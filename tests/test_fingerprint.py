@@ -0,0 +1,106 @@
+# test_fingerprint.py
+import json
+
+from fingerprint import (
+    fingerprint, fingerprint_key, legacy_key, FingerprintSet, load_digests, save_digests,
+)
+
+
+def test_fingerprint_normalizes_whitespace():
+    a = fingerprint("2024-01-01 00:00:00", "UID 10  failed\tupload")
+    b = fingerprint("2024-01-01 00:00:00", "UID 10 failed upload")
+    assert a == b
+    assert 0 < a < 2 ** 64
+    assert a != fingerprint("2024-01-01 00:00:01", "UID 10 failed upload")
+    assert a != fingerprint("2024-01-01 00:00:00", "UID 10 failed upload", "MEGA")
+
+
+def test_fingerprint_key_depends_on_category():
+    fp = fingerprint("ts", "msg")
+    assert fingerprint_key(fp, "MEGA") != fingerprint_key(fp, "ERROR")
+    assert fingerprint_key(fp, "MEGA") == fingerprint_key(fp, "MEGA")
+
+
+# =====================================================
+# SET
+# =====================================================
+def test_set_add_contains_get():
+    s = FingerprintSet()
+    s.add(123, 5.0)
+    s.add(456)
+    assert 123 in s and 456 in s and 789 not in s
+    assert s.get(123) == 5.0
+    assert s.get(789, "x") == "x"
+    s.add(123, 7.0)         # key đã có → chỉ cập nhật stamp
+    assert len(s) == 2 and s.get(123) == 7.0
+
+
+def test_set_resize_keeps_every_key():
+    s = FingerprintSet(capacity=4)
+    size = len(s.keys)
+    fps = [fingerprint(i, "msg") for i in range(5000)]
+    for i, fp in enumerate(fps):
+        s.add(fp, float(i))
+    assert len(s.keys) > size
+    assert len(s) == 5000
+    assert all(fp in s for fp in fps)
+    assert s.get(fps[1234]) == 1234.0
+    assert sorted(s) == sorted(fps)
+
+
+def test_set_colliding_slots():
+    s = FingerprintSet(capacity=8)
+    mask = s.mask
+    # cùng slot đầu → probe tuyến tính
+    fps = [(i * (mask + 1)) | 3 for i in range(1, 6)]
+    for fp in fps:
+        s.add(fp)
+    assert all(fp in s for fp in fps)
+    assert ((6 * (mask + 1)) | 3) not in s
+
+
+def test_set_expire():
+    s = FingerprintSet()
+    for i in range(1, 101):
+        s.add(i, float(i))
+    assert s.expire(51.0) == 50
+    assert len(s) == 50
+    assert 50 not in s and 51 in s and 100 in s
+    assert s.expire(0.0) == 0
+    s.add(1000, 200.0)
+    assert 1000 in s and len(s) == 51
+
+
+# =====================================================
+# PERSISTENCE
+# =====================================================
+def test_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / "history.json")
+    fps = [fingerprint(i, "x") for i in range(100)]
+    save_digests(path, FingerprintSet(fps))
+    loaded = load_digests(path)
+    assert sorted(loaded) == sorted(fps)
+
+
+def test_load_missing_or_corrupt(tmp_path):
+    assert len(load_digests(str(tmp_path / "missing.json"))) == 0
+    bad = tmp_path / "bad.json"
+    bad.write_text("{not json")
+    assert len(load_digests(str(bad))) == 0
+
+
+def test_legacy_history_is_converted(tmp_path):
+    path = tmp_path / "sent_history.json"
+    path.write_text(json.dumps({
+        "CHECKPOINT|2024-01-01 00:00:00|creating checkpoint at global_step 10": True,
+        "MEGA|2024-01-01 00:00:01|MEGA SLASH UID 44": True,
+        "2024-01-01 00:00:02|UID 10 failed  upload": True,
+    }))
+    loaded = load_digests(str(path))
+    assert len(loaded) == 3
+    assert fingerprint_key(fingerprint("2024-01-01 00:00:00",
+                                       "creating checkpoint at global_step 10"), "CHECKPOINT") in loaded
+    assert fingerprint_key(fingerprint("2024-01-01 00:00:01", "MEGA SLASH UID 44"), "MEGA") in loaded
+    # không có prefix → ERROR, message được chuẩn hoá như digest mới
+    assert fingerprint_key(fingerprint("2024-01-01 00:00:02", "UID 10 failed upload"), "ERROR") in loaded
+    assert legacy_key("2024-01-01 00:00:02|UID 10 failed upload") in loaded
@@ -0,0 +1,111 @@
+# test_log_archive.py
+import json
+import time
+import zlib
+import datetime
+
+import log_archive
+from log_archive import LogArchive, query, list_segments
+from row_parser import LogRecord
+
+T0 = datetime.datetime(2024, 1, 1, 0, 0, 0)
+
+
+def rec(i, uid, window, msg=None):
+    t = T0 + datetime.timedelta(seconds=i)
+    return LogRecord(t.strftime("%Y-%m-%d %H:%M:%S"), t, msg or f"line {i}", i, uid=uid, window=window)
+
+
+def write(folder, records, **kw):
+    arch = LogArchive(str(folder), block_records=10, flush_interval=60, **kw)
+    for r in records:
+        arch.append(r)
+    arch.close()
+
+
+def blocks(folder):
+    out = []
+    for base in list_segments(str(folder)):
+        with open(base + ".idx") as f:
+            out += [json.loads(ln) for ln in f]
+    return out
+
+
+def count_decompress(monkeypatch):
+    calls = []
+    real = zlib.decompress
+
+    def fake(data):
+        calls.append(len(data))
+        return real(data)
+    monkeypatch.setattr(log_archive.zlib, "decompress", fake)
+    return calls
+
+
+# 3 block × 10 dòng: block 0 = UID 10 / window 1, block 1 = UID 44 / window 2,
+# block 2 = UID 10 / window 3 (dòng 25 nhắc UID 204 trong message)
+def sample():
+    out = [rec(i, 10, 1) for i in range(10)]
+    out += [rec(i, 44, 2) for i in range(10, 20)]
+    out += [rec(i, 10, 3, "MEGA SLASH UID 204" if i == 25 else None) for i in range(20, 30)]
+    return out
+
+
+def test_index_per_block(tmp_path):
+    write(tmp_path, sample())
+    idx = blocks(tmp_path)
+    assert [b["n"] for b in idx] == [10, 10, 10]
+    assert [b["windows"] for b in idx] == [["1"], ["2"], ["3"]]
+    assert [b["uids"] for b in idx] == [["10"], ["44"], ["10", "204"]]
+    assert idx[1]["t0"] == (T0 + datetime.timedelta(seconds=10)).timestamp()
+    assert idx[1]["t1"] == (T0 + datetime.timedelta(seconds=19)).timestamp()
+
+
+def test_query_by_uid_reads_only_matching_blocks(tmp_path, monkeypatch):
+    write(tmp_path, sample())
+    calls = count_decompress(monkeypatch)
+    got = list(query(str(tmp_path), uid=44))
+    assert [r["msg"] for r in got] == [f"line {i}" for i in range(10, 20)]
+    assert len(calls) == 1
+
+
+def test_query_uid_mentioned_in_message(tmp_path, monkeypatch):
+    write(tmp_path, sample())
+    calls = count_decompress(monkeypatch)
+    got = list(query(str(tmp_path), uid="204"))
+    assert [r["msg"] for r in got] == ["MEGA SLASH UID 204"]
+    assert len(calls) == 1
+
+
+def test_query_by_window_and_uid(tmp_path, monkeypatch):
+    write(tmp_path, sample())
+    calls = count_decompress(monkeypatch)
+    assert len(list(query(str(tmp_path), uid=10, window=3))) == 10
+    assert list(query(str(tmp_path), uid=44, window=3)) == []
+    assert len(calls) == 1
+
+
+def test_query_by_time_range(tmp_path, monkeypatch):
+    write(tmp_path, sample())
+    calls = count_decompress(monkeypatch)
+    since = (T0 + datetime.timedelta(seconds=12)).timestamp()
+    until = (T0 + datetime.timedelta(seconds=21)).timestamp()
+    got = list(query(str(tmp_path), since=since, until=until))
+    assert [r["msg"] for r in got] == [f"line {i}" for i in range(12, 22)]
+    assert len(calls) == 2
+
+
+def test_query_skips_torn_index_line(tmp_path):
+    write(tmp_path, sample())
+    base = list_segments(str(tmp_path))[-1]
+    with open(base + ".idx", "a") as f:
+        f.write('{"off": 123, "le')
+    assert len(list(query(str(tmp_path), uid=10))) == 20
+
+
+def test_old_segments_pruned(tmp_path):
+    for i in range(3):
+        write(tmp_path, [rec(i, 10, i)], max_segments=2)
+        time.sleep(0.01)        # tên segment theo epoch đến mili giây
+    assert len(list_segments(str(tmp_path))) == 2
+    assert [r["window"] for r in query(str(tmp_path))] == [1, 2]
@@ -0,0 +1,134 @@
+# test_outbox.py
+import json
+import time
+
+from outbox import Outbox, PermanentError, split_content
+
+
+def wait_until(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(ln) for ln in f if ln.strip()]
+
+
+def add_rec(id_, content, channel="main"):
+    return {"op": "add", "id": id_, "key": id_, "channel": channel, "content": content, "t": 0}
+
+
+# =====================================================
+# REPLAY / COMPACT
+# =====================================================
+def test_replay_sends_only_pending_after_crash(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    # crash: "a" đã gửi, "b" và "c" chưa, dòng cuối ghi dở
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in (add_rec("000000000000000a", "A"), add_rec("000000000000000b", "B"),
+                    {"op": "done", "id": "000000000000000a", "key": "000000000000000a"},
+                    add_rec("000000000000000c", "C")):
+            f.write(json.dumps(rec) + "\n")
+        f.write('{"op": "add", "id": "00000000000')
+
+    sent = []
+    ob = Outbox(path, {"main": lambda m: sent.append(m) or True}, log=lambda m: None)
+    assert wait_until(lambda: len(sent) == 2 and len(ob) == 0)
+    ob.close()
+
+    assert sent == ["B", "C"]
+    assert sorted(ob.keys()) == [0xa, 0xb, 0xc]
+
+    # mở lại: không còn gì để gửi
+    again = []
+    ob2 = Outbox(path, {"main": lambda m: again.append(m) or True}, log=lambda m: None)
+    time.sleep(0.1)
+    ob2.close()
+    assert again == []
+
+
+def test_startup_compacts_file(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, 51):
+            f.write(json.dumps(add_rec(f"{i:016x}", str(i))) + "\n")
+            f.write(json.dumps({"op": "done", "id": f"{i:016x}", "key": f"{i:016x}"}) + "\n")
+        f.write(json.dumps(add_rec(f"{99:016x}", "pending")) + "\n")
+
+    ob = Outbox(path, {"main": lambda m: False}, log=lambda m: None,
+                retry_base=60, keep_done=10)
+    ob.close()
+
+    recs = read_jsonl(path)
+    assert [r["op"] for r in recs].count("done") == 10
+    assert [r for r in recs if r["op"] == "add"] == [add_rec(f"{99:016x}", "pending")]
+
+
+def test_commit_is_durable_before_delivery(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    ob = Outbox(path, {"main": lambda m: False}, log=lambda m: None, retry_base=60)
+    assert ob.add(7, "main", "hello")
+    assert not ob.add(7, "main", "hello")      # cùng key → bỏ qua
+    ob.commit()
+    ob.close()
+
+    sent = []
+    ob2 = Outbox(path, {"main": lambda m: sent.append(m) or True}, log=lambda m: None)
+    assert wait_until(lambda: sent == ["hello"])
+    ob2.close()
+
+
+def test_permanent_error_is_dead_lettered(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+
+    def send(m):
+        if m == "bad":
+            raise PermanentError("HTTP 400")
+        return True
+
+    ob = Outbox(path, {"main": send}, log=lambda m: None)
+    ob.add(1, "main", "bad")
+    ob.add(2, "main", "good")
+    ob.commit()
+    assert wait_until(lambda: len(ob) == 0)
+    ob.close()
+
+    assert (ob.sent, ob.dead) == (1, 1)
+    dead = read_jsonl(str(tmp_path / "outbox.dead.jsonl"))
+    assert [d["content"] for d in dead] == ["bad"]
+
+
+# =====================================================
+# SPLIT
+# =====================================================
+def test_split_short_content_unchanged():
+    assert split_content("abc", limit=10) == ["abc"]
+
+
+def test_split_reassembles_lines():
+    content = "\n".join(f"line {i} " + "x" * (i % 7) for i in range(200))
+    parts = split_content(content, limit=100)
+    assert all(len(p) <= 100 for p in parts)
+    assert "\n".join(parts) == content
+
+
+def test_split_long_line_is_cut():
+    content = "y" * 250
+    parts = split_content(content, limit=100)
+    assert [len(p) for p in parts] == [100, 100, 50]
+    assert "".join(parts) == content
+
+
+def test_split_keeps_code_fence_in_each_part():
+    body = "\n".join(f"uid {i:3d} | weight 0.{i:04d}" for i in range(100))
+    content = f"```\n{body}\n```"
+    parts = split_content(content, limit=300)
+    assert len(parts) > 1
+    assert all(len(p) <= 300 for p in parts)
+    assert all(p.startswith("```\n") and p.endswith("\n```") for p in parts)
+    assert "\n".join(p[4:-4] for p in parts) == body